@@ -0,0 +1,99 @@
+import numpy as np
+import pandas
+
+from src.point import PointsTable, cartesian_coordinates
+
+
+def _uniform_coordinates(n, rng):
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    longitudes = rng.uniform(-180, 180, n)
+    return latitudes, longitudes
+
+
+def _random_field(rng, waves=8):
+    """
+    :return: random smooth function of cartesian coordinates of points on the sphere, a sum of waves along random
+    directions
+    """
+    directions = cartesian_coordinates(*_uniform_coordinates(waves, rng))
+    frequencies = rng.uniform(1, 4, waves)
+    phases = rng.uniform(0, 2 * np.pi, waves)
+
+    def field(xyz):
+        return np.cos(xyz @ directions.T * frequencies + phases).sum(axis=1) / np.sqrt(waves)
+
+    return field
+
+
+def uniform(n, rng):
+    """
+    :return: latitudes and longitudes of n points spread uniformly over the sphere
+    """
+    return _uniform_coordinates(n, rng)
+
+
+def clustered(n, rng, clusters=20, spread=0.1):
+    """
+    :return: latitudes and longitudes of n points in gaussian clusters around random centers
+    """
+    centers = cartesian_coordinates(*_uniform_coordinates(clusters, rng))
+    xyz = centers[rng.integers(0, clusters, n)] + rng.normal(0, spread, (n, 3))
+    xyz /= np.linalg.norm(xyz, axis=1)[:, np.newaxis]
+    return np.degrees(np.arcsin(np.clip(xyz[:, 2], -1, 1))), np.degrees(np.arctan2(xyz[:, 0], xyz[:, 1]))
+
+
+def continent_like(n, rng, land=0.3):
+    """
+    :return: latitudes and longitudes of n points on random smooth "continents" covering a part of the sphere
+    """
+    field = _random_field(rng)
+    threshold = np.quantile(field(cartesian_coordinates(*_uniform_coordinates(10000, rng))), 1 - land)
+
+    latitudes, longitudes = np.empty(0), np.empty(0)
+    while len(latitudes) < n:
+        lat, lon = _uniform_coordinates(n, rng)
+        on_land = field(cartesian_coordinates(lat, lon)) > threshold
+        latitudes = np.concatenate([latitudes, lat[on_land]])
+        longitudes = np.concatenate([longitudes, lon[on_land]])
+
+    return latitudes[:n], longitudes[:n]
+
+
+DATASETS = {'uniform': uniform, 'clustered': clustered, 'continent_like': continent_like}
+
+
+def synthetic_points(dataset, n, seed=0):
+    """
+    :param dataset: name of a dataset from DATASETS
+    :param n: number of points
+    :param seed: seed of the random generator, the same seed gives the same points
+    :return: PointsTable with regressions growing towards north, with smooth random field and noise added
+    """
+    rng = np.random.default_rng(seed)
+    latitudes, longitudes = DATASETS[dataset](n, rng)
+
+    xyz = cartesian_coordinates(latitudes, longitudes)
+    regressions = 0.01 + 0.005 * xyz[:, 2] + 0.005 * _random_field(rng)(xyz) + rng.normal(0, 0.002, n)
+
+    return PointsTable(['p{}'.format(i) for i in range(n)], latitudes, longitudes, regressions)
+
+
+def synthetic_temperatures(cities, months, seed=0):
+    """
+    :return: DataFrame like the Berkeley Earth cities file (dt, AverageTemperature, City, Latitude, Longitude), with
+    monthly temperatures of given number of cities, starting from January 1900
+    """
+    rng = np.random.default_rng(seed)
+    latitudes, longitudes = _uniform_coordinates(cities, rng)
+    slopes = rng.normal(0.01, 0.005, cities)
+
+    city = np.repeat(np.arange(cities), months)
+    month = np.tile(np.arange(months), cities)
+    temperatures = 10 + slopes[city] * month / 12 + 5 * np.sin(month * np.pi / 6) + rng.normal(0, 1, len(city))
+
+    return pandas.DataFrame({
+        'dt': ['{}-{:02d}-01'.format(1900 + m // 12, m % 12 + 1) for m in range(months)] * cities,
+        'AverageTemperature': temperatures,
+        'City': np.char.add('c', city.astype(str)),
+        'Latitude': np.char.add(np.abs(latitudes).round(2).astype(str), np.where(latitudes >= 0, 'N', 'S'))[city],
+        'Longitude': np.char.add(np.abs(longitudes).round(2).astype(str), np.where(longitudes >= 0, 'E', 'W'))[city]})
@@ -0,0 +1,183 @@
+"""
+Times main steps of the pipeline on synthetic data and prints results as JSON, e.g.
+
+    python -m benchmarks.run_benchmarks --sizes 1000,10000 --output bench.json
+"""
+from benchmarks.datasets import DATASETS, synthetic_points, synthetic_temperatures
+from src.delaunay_diagram import DelaunayDiagram
+from src.points_set import PointsSet
+from src.simulated_annealing import SimulatedAnnealing
+import src.linear_regression as linear_regression
+import src.point as point
+
+import numpy as np
+import pandas as pd
+import argparse
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+
+parser = argparse.ArgumentParser(description='Benchmark the pipeline on synthetic points')
+parser.add_argument('--sizes', default='1000,10000,100000,200000', help='comma separated numbers of points')
+parser.add_argument('--datasets', default=','.join(DATASETS), help='comma separated names of datasets')
+parser.add_argument('--seed', default=0, type=int)
+parser.add_argument('--repeats', default=3, type=int, help='the best time of that many runs is reported')
+parser.add_argument('--moves', default=200, type=int, help='number of PointsSet moves to time')
+parser.add_argument('--iterations', default=2000, type=int, help='number of simulated annealing iterations')
+parser.add_argument('--output', default=None, help='.json file for results, printed if not given')
+
+
+def _best_time(function, repeats):
+    """
+    :return: the shortest time of running the function and its last result
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _result(name, seconds, operations=1):
+    return {'benchmark': name, 'seconds': seconds, 'operations': operations,
+            'per_second': operations / seconds if seconds > 0 else None}
+
+
+# most of the points are eligible, so that regions can grow
+MINIMAL_REGRESSION_QUANTILE = 0.2
+
+
+def _new_points_set(diagram, rng):
+    minimal_regression = float(np.quantile(diagram.regressions, MINIMAL_REGRESSION_QUANTILE))
+    starting_point = int(rng.choice(np.flatnonzero(diagram.regressions > minimal_regression)))
+    return PointsSet(diagram, starting_point, 1.0, minimal_regression)
+
+
+def benchmark_points_set(diagram, moves, seed):
+    """
+    Grows a region from a random point and then shrinks it, timing single operations
+    """
+    points_set = _new_points_set(diagram, np.random.default_rng(seed))
+    rng = np.random.default_rng(seed)
+
+    times = {'value_with_added': [0.0, 0], 'add_point': [0.0, 0], 'value_with_removed': [0.0, 0],
+             'remove_point': [0.0, 0]}
+
+    def timed(name, function, argument):
+        start = time.perf_counter()
+        function(argument)
+        times[name][0] += time.perf_counter() - start
+        times[name][1] += 1
+
+    for _ in range(moves):
+        if len(points_set.points_to_add) == 0:
+            break
+        candidates = sorted(points_set.points_to_add)
+        for p in candidates:
+            timed('value_with_added', points_set.value_with_added, p)
+        timed('add_point', points_set.add_point, candidates[rng.integers(len(candidates))])
+
+    for _ in range(moves // 2):
+        if len(points_set.points_to_remove) == 0:
+            break
+        candidates = sorted(points_set.points_to_remove)
+        for p in candidates:
+            timed('value_with_removed', points_set.value_with_removed, p)
+        timed('remove_point', points_set.remove_point, candidates[rng.integers(len(candidates))])
+
+    return [_result('points_set.' + name, seconds, operations) for name, (seconds, operations) in times.items()
+            if operations > 0]
+
+
+def benchmark_simulated_annealing(diagram, iterations, seed):
+    points_set = _new_points_set(diagram, np.random.default_rng(seed))
+    simulated_annealing = SimulatedAnnealing(points_set, temperature=1.0, max_iterations=iterations, seed=seed,
+                                             log_interval=0)
+
+    start = time.perf_counter()
+    simulated_annealing.calculate()
+    return [_result('simulated_annealing.iterations', time.perf_counter() - start, simulated_annealing.iterations)]
+
+
+def benchmark_loading(table, repeats):
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'points.csv')
+        pd.DataFrame({'City': table.labels,
+                      'Latitude': [point._geo_coord_float_to_str(c, 'N', 'S') for c in table.latitudes.tolist()],
+                      'Longitude': [point._geo_coord_float_to_str(c, 'E', 'W') for c in table.longitudes.tolist()],
+                      'Regression': table.regressions}).to_csv(filename)
+
+        seconds, _ = _best_time(lambda: point.load_table_from_csv(filename), repeats)
+        results = [_result('load_table_from_csv', seconds, len(table))]
+        seconds, _ = _best_time(lambda: point.load_from_csv(filename), repeats)
+        results.append(_result('load_from_csv', seconds, len(table)))
+    return results
+
+
+def benchmark_linear_regression(n, repeats, seed, months=240):
+    temperatures = synthetic_temperatures(max(n // 10, 1), months, seed)
+    seconds, _ = _best_time(
+        lambda: linear_regression.sums_to_regressions(linear_regression.regression_sums(temperatures)), repeats)
+    return [_result('linear_regression.fit', seconds, len(temperatures))]
+
+
+def run(sizes, datasets, seed, repeats, moves, iterations):
+    results = []
+    for dataset in datasets:
+        for n in sizes:
+            table = synthetic_points(dataset, n, seed)
+            seconds, diagram = _best_time(lambda: DelaunayDiagram(table), repeats)
+
+            dataset_results = [_result('delaunay_diagram', seconds, n)]
+            dataset_results += benchmark_points_set(diagram, moves, seed)
+            dataset_results += benchmark_simulated_annealing(diagram, iterations, seed)
+            dataset_results += benchmark_loading(table, repeats)
+            if dataset == datasets[0]:
+                dataset_results += benchmark_linear_regression(n, repeats, seed)
+
+            for result in dataset_results:
+                results.append(dict(result, dataset=dataset, points=n))
+                # progress goes to stderr, so printed results stay valid JSON
+                print("{dataset} {points}: {benchmark} {operations} in {seconds:.4f} s".format(**results[-1]),
+                      file=sys.stderr, flush=True)
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    args = parser.parse_args()
+    sizes = [int(n) for n in args.sizes.split(',')]
+    datasets = args.datasets.split(',')
+
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'seed': args.seed,
+        'results': run(sizes, datasets, args.seed, args.repeats, args.moves, args.iterations),
+    }
+
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+
+class EligibleComponents:
+    """
+    Connected components of the Delaunay diagram's neighbour graph restricted to points with regression above
+    minimal. A points set can never leave the component of its first point, so a component's size and the area of
+    triangles inside it bound the value a set started there can reach.
+
+    Arrays:
+     - labels: (N,) component of every point, -1 for points with regression not above minimal
+     - sizes: (C,) number of points in every component
+     - areas: (C,) total area of triangles with all corners in the component
+    """
+
+    def __init__(self, delaunay_diagram, minimal_regression):
+        self.minimal_regression = minimal_regression
+        eligible = delaunay_diagram.regressions > minimal_regression
+        points_n = delaunay_diagram.points_n
+
+        a, b = delaunay_diagram.edges[eligible[delaunay_diagram.edges].all(axis=1)].T
+        graph = scipy.sparse.coo_matrix((np.ones(len(a)), (a, b)), shape=(points_n, points_n))
+        _, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+
+        # ineligible points are components of their own, they are left out and the rest is numbered from 0
+        self.labels = np.full(points_n, -1, dtype=np.int64)
+        _, self.labels[eligible] = np.unique(labels[eligible], return_inverse=True)
+        components_n = self.labels.max() + 1
+
+        self.sizes = np.bincount(self.labels[eligible], minlength=components_n)
+        inside = eligible[delaunay_diagram.simplices].all(axis=1)
+        self.areas = np.bincount(self.labels[delaunay_diagram.simplices[inside, 0]],
+                                 weights=delaunay_diagram.areas[inside], minlength=components_n)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def value_bounds(self, minimal_density):
+        """
+        :return: (C,) highest value a points set can reach in every component
+        """
+        return np.minimum(self.areas, self.sizes / minimal_density)
+
+    def value_bound(self, point, minimal_density):
+        """
+        :param point: index of a point of a points set, which stays in the point's component
+        :return: highest value the set can reach, None for a point with regression not above minimal, which is in no
+        component, so nothing bounds the set
+        """
+        component = self.labels[point]
+        if component == -1:
+            return None
+        return float(self.value_bounds(minimal_density)[component])
+
+    def promising(self, minimal_density, fraction):
+        """
+        :param fraction: part of the highest bound of all components a promising one has to reach
+        :return: indices of components worth starting in
+        """
+        bounds = self.value_bounds(minimal_density)
+        return np.flatnonzero(bounds >= fraction * bounds.max())
+
+    def points(self, components):
+        """
+        :param components: indices of components
+        :return: indices of points in them
+        """
+        return np.flatnonzero(np.isin(self.labels, components))
+
+
+def triangle_components(delaunay_diagram, inside):
+    """
+    :param inside: (T,) boolean mask of triangles
+    :return: (T,) component of every triangle inside, connected through common edges, -1 for the others, and the
+    number of components
+    """
+    adjacency = delaunay_diagram.triangle_adjacency
+    triangles, sides = np.nonzero(inside[:, None] & inside[adjacency])
+    triangles_n = len(inside)
+    graph = scipy.sparse.coo_matrix((np.ones(len(triangles)), (triangles, adjacency[triangles, sides])),
+                                    shape=(triangles_n, triangles_n))
+    _, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+
+    components = np.full(triangles_n, -1, dtype=np.int64)
+    _, components[inside] = np.unique(labels[inside], return_inverse=True)
+    return components, components.max() + 1 if inside.any() else 0
+
+
+def connected_region(delaunay_diagram, points):
+    """
+    Part of the points, whose triangles, those with all corners in the part, are connected through common edges, as
+    triangles of a PointsSet of them are. Triangles of the points are cut to their component with the largest area,
+    but its corners may still make triangles of other components, touching it only at corners. Then a corner of
+    every such triangle, the one in the fewest triangles of the component, is left out, until one component is left.
+
+    :param points: indices of points
+    :return: indices of points of the region, empty if the points make no triangle
+    """
+    simplices = delaunay_diagram.simplices
+    areas = delaunay_diagram.areas
+    region = np.zeros(delaunay_diagram.points_n, dtype=bool)
+    region[points] = True
+    while True:
+        inside = region[simplices].all(axis=1)
+        components, components_n = triangle_components(delaunay_diagram, inside)
+        if components_n == 0:
+            return np.empty(0, dtype=np.int64)
+        if components_n == 1:
+            return np.unique(simplices[inside])
+
+        kept = components == np.bincount(components[inside], weights=areas[inside]).argmax()
+        region[:] = False
+        region[simplices[kept]] = True
+        others = ~kept & region[simplices].all(axis=1)
+        if others.any():
+            counts = np.bincount(simplices[kept].ravel(), minlength=len(region))
+            corners = simplices[others]
+            region[corners[np.arange(len(corners)), counts[corners].argmin(axis=1)]] = False
@@ -0,0 +1,141 @@
+import math
+
+
+class CoolingSchedule:
+    """
+    Gives temperature of simulated annealing for the next iteration. Schedules that change with the run's progress
+    keep their variables listed in STATE, so they are saved in checkpoints.
+    """
+    STATE = []
+
+    def __init__(self, t0):
+        self.t0 = t0
+
+    def next_temperature(self, iteration, accepted, improved):
+        """
+        :param iteration: number of iterations done
+        :param accepted: whether the last move was accepted
+        :param improved: whether the last iteration improved the best value
+        :return: temperature
+        """
+        raise NotImplementedError
+
+    def state(self):
+        return {name: getattr(self, name) for name in self.STATE}
+
+    def restore(self, state):
+        for name in self.STATE:
+            setattr(self, name, state[name])
+
+
+class Constant(CoolingSchedule):
+    """
+    Temperature t0 in every iteration, t0 can be changed between iterations
+    """
+    STATE = ['t0']
+
+    def next_temperature(self, iteration, accepted, improved):
+        return self.t0
+
+
+class Geometric(CoolingSchedule):
+    """
+    Temperature multiplied by rate every epoch iterations, with epoch 1 it is the exponential schedule
+    """
+
+    def __init__(self, t0, rate=0.95, epoch=1):
+        super().__init__(t0)
+        self.rate = rate
+        self.epoch = epoch
+
+    def next_temperature(self, iteration, accepted, improved):
+        return self.t0 * math.pow(self.rate, iteration // self.epoch)
+
+
+class Logarithmic(CoolingSchedule):
+    """
+    t0 / log(e + k) for k-th epoch, cools much slower than geometric schedules
+    """
+
+    def __init__(self, t0, epoch=1):
+        super().__init__(t0)
+        self.epoch = epoch
+
+    def next_temperature(self, iteration, accepted, improved):
+        return self.t0 / math.log(math.e + iteration // self.epoch)
+
+
+class Adaptive(CoolingSchedule):
+    """
+    Every epoch the temperature is lowered by rate if more moves than target_acceptance were accepted, raised
+    otherwise. The target is lowered by rate every epoch, so the run freezes eventually.
+    """
+    STATE = ['temperature', 'target_acceptance', 'accepted', 'proposed']
+
+    def __init__(self, t0, rate=0.95, epoch=1000, target_acceptance=0.5):
+        super().__init__(t0)
+        self.rate = rate
+        self.epoch = epoch
+        self.temperature = t0
+        self.target_acceptance = target_acceptance
+        self.accepted = 0
+        self.proposed = 0
+
+    def next_temperature(self, iteration, accepted, improved):
+        self.proposed += 1
+        self.accepted += accepted
+        if self.proposed == self.epoch:
+            if self.accepted > self.target_acceptance * self.proposed:
+                self.temperature *= self.rate
+            else:
+                self.temperature /= self.rate
+            self.target_acceptance *= self.rate
+            self.accepted = 0
+            self.proposed = 0
+        return self.temperature
+
+
+class Reheating(Geometric):
+    """
+    Geometric schedule started again, from factor times the previous starting temperature, after reheat_after
+    iterations without improvement of the best value
+    """
+    STATE = ['start_temperature', 'start_iteration', 'last_improvement']
+
+    def __init__(self, t0, rate=0.95, epoch=1, reheat_after=1000, factor=0.5):
+        super().__init__(t0, rate, epoch)
+        self.reheat_after = reheat_after
+        self.factor = factor
+        self.start_temperature = t0
+        self.start_iteration = 0
+        self.last_improvement = 0
+
+    def next_temperature(self, iteration, accepted, improved):
+        if improved:
+            self.last_improvement = iteration
+        elif iteration - max(self.last_improvement, self.start_iteration) >= self.reheat_after:
+            self.start_temperature *= self.factor
+            self.start_iteration = iteration
+        return self.start_temperature * math.pow(self.rate, (iteration - self.start_iteration) // self.epoch)
+
+
+SCHEDULES = ['geometric', 'logarithmic', 'adaptive', 'reheating']
+
+
+def cooling_schedule(name, t0, rate=0.95, epoch=None, reheat_after=1000):
+    """
+    :param name: one of SCHEDULES
+    :param epoch: iterations with the same temperature, for adaptive schedule iterations between adjustments, None
+    takes the schedule's default: 1000 for adaptive schedule, which needs enough moves to measure acceptance, 1 for
+    the others
+    :return: CoolingSchedule
+    """
+    if name == 'geometric':
+        return Geometric(t0, rate, epoch if epoch is not None else 1)
+    if name == 'logarithmic':
+        return Logarithmic(t0, epoch if epoch is not None else 1)
+    if name == 'adaptive':
+        return Adaptive(t0, rate, epoch if epoch is not None else 1000)
+    if name == 'reheating':
+        return Reheating(t0, rate, epoch if epoch is not None else 1, reheat_after)
+    raise ValueError("Unknown cooling schedule: {}".format(name))
@@ -1,13 +1,14 @@
 import numpy as np
 import scipy.spatial
-import spherical_geometry.polygon as geom
 
+import hashlib
+import os
 import sys
+from collections.abc import Mapping
+from functools import cached_property
 
 import src.point as point
 
-from statistics import median
-
 
 class Triangle:
     def __init__(self, area, corners):
@@ -18,98 +19,799 @@ class Triangle:
         self.points = corners
 
 
+class _UsedRows:
+    """
+    Array attribute kept in a buffer with spare rows, stored under the attribute's name with _ prefix. Reading it
+    gives a view of the rows in use, their number is held by the count attribute.
+    """
+
+    def __init__(self, count):
+        self._count = count
+
+    def __set_name__(self, owner, name):
+        self._buffer = '_' + name
+
+    def __get__(self, diagram, owner=None):
+        if diagram is None:
+            return self
+        return getattr(diagram, self._buffer)[:getattr(diagram, self._count)]
+
+    def __set__(self, diagram, value):
+        setattr(diagram, self._buffer, value)
+        setattr(diagram, self._count, len(value))
+
+
 class DelaunayDiagram:
     """
-    Variables:
+    Points and triangles are identified by their indices in the arrays below.
+
+    Arrays:
+     - labels, latitudes, longitudes, regressions: (N,) points' attributes
+     - coordinates: (N, 3) cartesian coordinates of points on the unit sphere
+     - simplices: (T, 3) indices of triangles' corners
+     - areas: (T,) triangles' areas
+     - triangle_adjacency: (T, 3) for each triangle indices of triangles sharing an edge with it, the i-th one
+       shares edge between corners i and (i + 1) % 3
+     - edges: (E, 2) indices of edges' ends, in ascending order
+     - edge_triangles: (E, 2) indices of two triangles having the edge in common
+     - neighbour_indptr, neighbour_indices: neighbours of point i are neighbour_indices[neighbour_indptr[i]:
+       neighbour_indptr[i + 1]]
+     - point_triangle_indptr, point_triangle_indices: the same for triangles point i is a corner of
+
+    The arrays are also available as lists (properties ending with _list) for fast access in Python loops.
+
+    Points can be added and removed with insert_points and remove_points, which retriangulate only the affected
+    part of the diagram. Arrays of points, triangles and edges are views of buffers with spare rows, which are
+    patched in place, and a point is located by walking over triangles from a triangle of a nearby point, so a change
+    costs as much as the part of the diagram it touches. Lists and indices of neighbours and triangles of points
+    built before the change are patched in rows of the points and triangles it touched, the fingerprint and variables
+    with Point objects are rebuilt when they are next used.
+
+    Variables (built on first use from the arrays), with Point objects as keys:
      - neighbours: dictionary that for each point holds a set of points that are its neighbours
      - neighbours_making_triangles: for each neighbouring points returns a set of points that make are common neighbour
        with the two making the key
-     - triangles: a dictionary that for tuples of points contains triangle areas
-    """
-
-    def __init__(self, points):
-        cartesian_points = [p.get_cartesian_coordinates([0, 0, 0], 1) for p in points]
-        delaunay = scipy.spatial.ConvexHull(cartesian_points)
-
-        self.neighbours = {p: set() for p in points}
-        self.neighbours_making_triangles = {}
-        self.triangles = {}
-        self.triangles_by_points = {p: set() for p in points}
-
-        for simplice in delaunay.simplices:
-            pts = [points[v] for v in simplice]
-            self.neighbours[pts[0]].add(pts[1])
-            self.neighbours[pts[0]].add(pts[2])
-            self.neighbours[pts[1]].add(pts[0])
-            self.neighbours[pts[1]].add(pts[2])
-            self.neighbours[pts[2]].add(pts[0])
-            self.neighbours[pts[2]].add(pts[1])
-
-            neighbouring_triangles = set()
-
-            if (pts[0], pts[1]) not in self.neighbours_making_triangles:
-                self.neighbours_making_triangles[(pts[0], pts[1])] = set()
-            else:
-                neighbouring_triangles.update([
-                    self.triangles[(pts[0], pts[1], p)] for p in self.neighbours_making_triangles[(pts[0], pts[1])]]
-                )
-            self.neighbours_making_triangles[(pts[0], pts[1])].add(pts[2])
-            if (pts[1], pts[0]) not in self.neighbours_making_triangles:
-                self.neighbours_making_triangles[(pts[1], pts[0])] = set()
-            self.neighbours_making_triangles[(pts[1], pts[0])].add(pts[2])
-            if (pts[0], pts[2]) not in self.neighbours_making_triangles:
-                self.neighbours_making_triangles[(pts[0], pts[2])] = set()
-            else:
-                neighbouring_triangles.update([
-                    self.triangles[(pts[0], pts[2], p)] for p in self.neighbours_making_triangles[(pts[0], pts[2])]]
-                )
-            self.neighbours_making_triangles[(pts[0], pts[2])].add(pts[1])
-            if (pts[2], pts[0]) not in self.neighbours_making_triangles:
-                self.neighbours_making_triangles[(pts[2], pts[0])] = set()
-            self.neighbours_making_triangles[(pts[2], pts[0])].add(pts[1])
-            if (pts[1], pts[2]) not in self.neighbours_making_triangles:
-                self.neighbours_making_triangles[(pts[1], pts[2])] = set()
-            else:
-                neighbouring_triangles.update([
-                    self.triangles[(pts[1], pts[2], p)] for p in self.neighbours_making_triangles[(pts[1], pts[2])]]
-                )
-            self.neighbours_making_triangles[(pts[1], pts[2])].add(pts[0])
-            if (pts[2], pts[1]) not in self.neighbours_making_triangles:
-                self.neighbours_making_triangles[(pts[2], pts[1])] = set()
-            self.neighbours_making_triangles[(pts[2], pts[1])].add(pts[0])
-
-            triangle = Triangle(geom.SphericalPolygon(
-                [p.get_cartesian_coordinates([0, 0, 0], 1) for p in pts],
-                [0, 0, 0]).area(), set(pts))
-
-            for t in neighbouring_triangles:
-                t.adjacent.add(triangle)
-                triangle.adjacent.add(t)
-
-            self.triangles[(pts[0], pts[1], pts[2])] = triangle
-            self.triangles[(pts[0], pts[2], pts[1])] = triangle
-            self.triangles[(pts[1], pts[0], pts[2])] = triangle
-            self.triangles[(pts[1], pts[2], pts[0])] = triangle
-            self.triangles[(pts[2], pts[0], pts[1])] = triangle
-            self.triangles[(pts[2], pts[1], pts[0])] = triangle
-
-            self.triangles_by_points[pts[0]].add(triangle)
-            self.triangles_by_points[pts[1]].add(triangle)
-            self.triangles_by_points[pts[2]].add(triangle)
+     - triangles: a mapping that for tuples of points (in any order) contains triangles
+     - triangles_by_points: dictionary that for each point holds a set of triangles it is a corner of
+    """
+
+    # arrays describing the triangulation, stored in cache files
+    CACHED_ARRAYS = ['simplices', 'areas', 'edges', 'edge_triangles', 'triangle_adjacency', 'neighbour_indptr',
+                     'neighbour_indices', 'point_triangle_indptr', 'point_triangle_indices']
+
+    # buffers growing together, with rows of points, triangles and edges
+    POINT_BUFFERS = ['_labels', '_latitudes', '_longitudes', '_regressions', '_coordinates', '_point_triangle']
+    TRIANGLE_BUFFERS = ['_simplices', '_areas', '_triangle_adjacency', '_triangle_edges']
+    EDGE_BUFFERS = ['_edges', '_edge_triangles']
+
+    labels = _UsedRows('_points_n')
+    latitudes = _UsedRows('_points_n')
+    longitudes = _UsedRows('_points_n')
+    regressions = _UsedRows('_points_n')
+    coordinates = _UsedRows('_points_n')
+    simplices = _UsedRows('_triangles_n')
+    areas = _UsedRows('_triangles_n')
+    triangle_adjacency = _UsedRows('_triangles_n')
+    edges = _UsedRows('_edges_n')
+    edge_triangles = _UsedRows('_edges_n')
+
+    def __init__(self, points, cache_file=None):
+        """
+        :param points: list of Points or PointsTable
+        :param cache_file: .npz file to load the triangulation from, it is built and saved there if the file does not
+        exist or was made for other points
+        """
+        table = points if isinstance(points, point.PointsTable) else point.PointsTable.from_points(points)
+        if not isinstance(points, point.PointsTable):
+            self.points = points
+
+        # columns are copied, as removing points overwrites them
+        self.labels = table.labels.copy()
+        self.latitudes = table.latitudes.copy()
+        self.longitudes = table.longitudes.copy()
+        self.regressions = table.regressions.copy()
+        self.coordinates = point.cartesian_coordinates(self.latitudes, self.longitudes)
+        # edges of every triangle and a triangle of every point, indexed by _index_triangles
+        self._triangle_edges = None
+        self._point_triangle = None
+        # rows touched by changes, patched by _refresh
+        self._changed_points = set()
+        self._changed_triangles = set()
+        self._changed_edges = set()
+
+        if cache_file is not None and self._load(cache_file):
+            return
+
+        self._build()
+
+        if cache_file is not None:
+            self.save(cache_file)
+
+    def _build(self):
+        points_n = len(self.latitudes)
+        delaunay = scipy.spatial.ConvexHull(self.coordinates)
+
+        self.simplices = delaunay.simplices.astype(np.int64)
+        self.areas = spherical_triangles_areas(self.coordinates, self.simplices)
+        self.edges, self.edge_triangles, self.triangle_adjacency, self._triangle_edges = _triangles_adjacency(
+            self.simplices, points_n)
+        self._index_triangles()
+
+    def save(self, filename):
+        """
+        Saves the triangulation together with fingerprint of points' coordinates into .npz file
+        """
+        np.savez(filename, fingerprint=self.fingerprint, **{name: getattr(self, name) for name in self.CACHED_ARRAYS})
+
+    def _load(self, filename):
+        """
+        :return: whether the triangulation was loaded, False if there is no file or it was made for other points
+        """
+        if not os.path.exists(filename):
+            return False
+
+        with np.load(filename, allow_pickle=False) as cached:
+            if str(cached['fingerprint']) != self.fingerprint:
+                print("Diagram cache {} was made for other points, rebuilding".format(filename))
+                return False
+            for name in self.CACHED_ARRAYS:
+                setattr(self, name, cached[name])
+
+        return True
+
+    @property
+    def _table(self):
+        return point.PointsTable(self.labels, self.latitudes, self.longitudes, self.regressions)
+
+    def insert_points(self, points):
+        """
+        Adds points to the diagram. Only triangles whose circumcircles contain a new point are replaced, by triangles
+        joining it with the border of the cavity they leave.
+
+        :param points: list of Points or PointsTable, they get indices following the existing points
+        :return: None
+        """
+        table = points if isinstance(points, point.PointsTable) else point.PointsTable.from_points(points)
+        self._index_triangles()
+        self._check_new(point.cartesian_coordinates(table.latitudes, table.longitudes))
+        first = self.points_n
+        self._reserve(self.POINT_BUFFERS, first + len(table))
+        if table.labels.dtype.itemsize > self._labels.dtype.itemsize:
+            self._labels = self._labels.astype(table.labels.dtype)
+        for column in ['labels', 'latitudes', 'longitudes', 'regressions']:
+            getattr(self, '_' + column)[first:first + len(table)] = getattr(table, column)
+        self._coordinates[first:first + len(table)] = point.cartesian_coordinates(table.latitudes, table.longitudes)
+        if 'points' in self.__dict__:
+            self.points.extend(points if not isinstance(points, point.PointsTable) else table.to_points())
+
+        for new_point in range(first, first + len(table)):
+            self._points_n = new_point + 1
+            self._insert(new_point)
+        self._changed_points.update(range(first, first + len(table)))
+        self._refresh()
+
+    def remove_points(self, indices):
+        """
+        Removes points from the diagram, only their triangles are replaced by a triangulation of the holes they leave.
+        The last points take indices of the removed ones.
+
+        :param indices: indices of points to remove
+        :return: (N,) array of new indices of the points, -1 for removed ones
+        """
+        self._index_triangles()
+        new_indices = np.arange(self.points_n)
+        original = np.arange(self.points_n)
+
+        # removing from the highest index, the last point moved in place of a removed one is never removed later
+        for removed in sorted(set(int(i) for i in indices), reverse=True):
+            self._remove(removed)
+
+            last = self.points_n - 1
+            new_indices[original[removed]] = -1
+            if removed != last:
+                self._rename(last, removed)
+                self._changed_points.add(removed)
+                for name in self.POINT_BUFFERS:
+                    buffer = getattr(self, name)
+                    buffer[removed] = buffer[last]
+                if 'points' in self.__dict__:
+                    self.points[removed] = self.points[last]
+                new_indices[original[last]] = removed
+                original[removed] = original[last]
+            self._points_n = last
+            if 'points' in self.__dict__:
+                self.points.pop()
+
+        self._refresh()
+        return new_indices
+
+    def _index_triangles(self):
+        """
+        Finds edges of every triangle and a triangle of every point, which changes of the diagram keep up to date
+        """
+        if self._point_triangle is not None:
+            return
+        if self._triangle_edges is None:
+            # edges of a loaded diagram are derived again, together with edges of triangles
+            self.edges, self.edge_triangles, _, self._triangle_edges = _triangles_adjacency(self.simplices,
+                                                                                           self.points_n)
+        self._point_triangle = np.empty(self.points_n, dtype=np.int64)
+        self._point_triangle[self.simplices.ravel()] = np.repeat(np.arange(len(self.simplices)), 3)
+
+    def _check_new(self, coordinates):
+        """
+        Raises ValueError, before the diagram is changed, if any of the points is in the diagram or given twice
+        """
+        _, first, counts = np.unique(coordinates, axis=0, return_index=True, return_counts=True)
+        if np.any(counts > 1):
+            raise ValueError("Point {} is given more than once".format(coordinates[first[np.argmax(counts > 1)]]))
+        for c in coordinates:
+            if not self._visible([self._locate(c, self.points_n)], c)[0]:
+                raise ValueError("Point {} is already in the diagram".format(c))
+
+    def _reserve(self, buffers, rows_n):
+        """
+        Grows the buffers, if they have less than rows_n rows, to twice as many rows, so they fit following changes
+        """
+        for name in buffers:
+            buffer = getattr(self, name)
+            if len(buffer) < rows_n:
+                grown = np.empty((max(rows_n, 2 * len(buffer)),) + buffer.shape[1:], dtype=buffer.dtype)
+                grown[:len(buffer)] = buffer
+                setattr(self, name, grown)
+
+    def _visible(self, triangles, coordinates):
+        """
+        :return: which of the triangles have the point in their circumcircles, that is the point is above their
+        planes, looking from the centre of the sphere
+        """
+        corners = self.coordinates[self.simplices[triangles]]
+        normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        normals *= np.sign(np.einsum('ij,ij->i', normals, corners[:, 0]))[:, None]
+        return np.einsum('ij,ij->i', normals, coordinates - corners[:, 0]) > 0
+
+    def _locate(self, coordinates, points_n):
+        """
+        Walks from a triangle of the nearest of about sqrt(points_n) evenly spread points, always crossing an edge
+        that separates the current triangle from the point
+
+        :param points_n: number of points of the diagram, the sample is taken from
+        :return: index of a triangle containing the point
+        """
+        step = max(1, int(points_n ** 0.5))
+        t = int(self._point_triangle[step * int(np.argmax(self._coordinates[:points_n:step] @ coordinates))])
+        q = coordinates.tolist()
+        for _ in range(self._triangles_n):
+            a, b, c = self._coordinates[self._simplices[t]].tolist()
+            # i-th edge separates the point from the triangle, if they are on opposite sides of its great circle
+            orientation = _triple_product(a, b, c)
+            sides = [_triple_product(a, b, q) * orientation, _triple_product(b, c, q) * orientation,
+                     _triple_product(c, a, q) * orientation]
+            i = min(range(3), key=sides.__getitem__)
+            if sides[i] >= 0:
+                return t
+            t = int(self._triangle_adjacency[t, i])
+        raise ValueError("Walk towards point {} does not end".format(coordinates))
+
+    def _star(self, p):
+        """
+        :return: triangles the point is a corner of, in order around it
+        """
+        start = int(self._point_triangle[p])
+        star = [start]
+        previous, t = start, int(self._triangle_adjacency[start, self._simplices[start].tolist().index(p)])
+        while t != start:
+            star.append(t)
+            i = self._simplices[t].tolist().index(p)
+            # two edges of the triangle end in the point, the walk continues across the one it did not come through
+            a, b = self._triangle_adjacency[t, i], self._triangle_adjacency[t, (i + 2) % 3]
+            previous, t = t, int(a if a != previous else b)
+        return star
+
+    def _insert(self, new_point):
+        coordinates = self.coordinates[new_point]
+
+        frontier = [self._locate(coordinates, new_point)]
+        cavity = set(frontier)
+        while len(frontier) > 0:
+            candidates = np.array(list({a for t in frontier for a in self._triangle_adjacency[t].tolist()
+                                        if a not in cavity}), dtype=np.int64)
+            if len(candidates) == 0:
+                break
+            frontier = candidates[self._visible(candidates, coordinates)].tolist()
+            cavity.update(frontier)
+
+        border = {}
+        new_triangles = []
+        for t in cavity:
+            corners, adjacent = self._simplices[t].tolist(), self._triangle_adjacency[t].tolist()
+            for i in range(3):
+                if adjacent[i] not in cavity:
+                    a, b = corners[i], corners[(i + 1) % 3]
+                    border[(min(a, b), max(a, b))] = adjacent[i]
+                    new_triangles.append((a, b, new_point))
+
+        self._replace_triangles(sorted(cavity), new_triangles, border)
+
+    def _remove(self, removed):
+        star = self._star(removed)
+
+        border = {}
+        for t in star:
+            corners, adjacent = self._simplices[t].tolist(), self._triangle_adjacency[t].tolist()
+            for i in range(3):
+                a, b = corners[i], corners[(i + 1) % 3]
+                if removed != a and removed != b:
+                    border[(min(a, b), max(a, b))] = adjacent[i]
+
+        self._replace_triangles(sorted(star), _fill_hole(self.coordinates, removed, border), border)
+
+    def _rename(self, old, new):
+        """
+        Changes index of a point in its triangles and edges
+        """
+        for t in self._star(old):
+            self._changed_points.update(self._simplices[t].tolist())
+            self._changed_triangles.add(t)
+            i = self._simplices[t].tolist().index(old)
+            self._simplices[t, i] = new
+            for e in self._triangle_edges[t, [i, (i + 2) % 3]].tolist():
+                a, b = self._edges[e].tolist()
+                self._edges[e] = sorted([new if a == old else a, new if b == old else b])
+
+    def _replace_triangles(self, removed, new_triangles, border):
+        """
+        :param removed: indices of triangles to remove
+        :param new_triangles: corners of triangles filling their place
+        :param border: for edges on the border of removed triangles, as pairs of corners in ascending order, the
+        triangle on the other side
+        :return: None
+        """
+        # edges on the border keep their indices, the ones inside are replaced by edges of new triangles
+        border_edges = {}
+        freed = set()
+        for t in removed:
+            corners = self._simplices[t].tolist()
+            self._changed_points.update(corners)
+            for i, e in enumerate(self._triangle_edges[t].tolist()):
+                a, b = corners[i], corners[(i + 1) % 3]
+                if (min(a, b), max(a, b)) in border:
+                    border_edges[(min(a, b), max(a, b))] = e
+                else:
+                    freed.add(e)
+        freed = sorted(freed)
+
+        slots = removed[:len(new_triangles)]
+        extra = len(new_triangles) - len(slots)
+        if extra > 0:
+            slots = slots + list(range(self._triangles_n, self._triangles_n + extra))
+            self._reserve(self.TRIANGLE_BUFFERS, self._triangles_n + extra)
+            self._triangles_n += extra
+
+        self._changed_triangles.update(slots)
+        self._changed_triangles.update(border.values())
+        self._simplices[slots] = new_triangles
+        self._areas[slots] = spherical_triangles_areas(self._coordinates, self._simplices[slots])
+        for slot, corners in zip(slots, new_triangles):
+            self._point_triangle[list(corners)] = slot
+
+        sides = {}
+        for slot, corners in zip(slots, new_triangles):
+            for i in range(3):
+                a, b = corners[i], corners[(i + 1) % 3]
+                sides.setdefault((min(a, b), max(a, b)), []).append((slot, i))
+        inner = [edge for edge, edge_sides in sides.items() if len(edge_sides) == 2]
+        indices = freed[:len(inner)]
+        if len(inner) > len(indices):
+            indices = indices + list(range(self._edges_n, self._edges_n + len(inner) - len(indices)))
+            self._reserve(self.EDGE_BUFFERS, indices[-1] + 1)
+            self._edges_n = indices[-1] + 1
+        for e, edge in zip(indices, inner):
+            (t, i), (u, j) = sides[edge]
+            self._triangle_adjacency[t, i] = u
+            self._triangle_adjacency[u, j] = t
+            self._triangle_edges[t, i] = self._triangle_edges[u, j] = e
+            self._edges[e] = edge
+            self._edge_triangles[e] = min(t, u), max(t, u)
+        self._changed_edges.update(indices)
+        self._changed_edges.update(border_edges.values())
+        for edge, e in border_edges.items():
+            (t, i), = sides[edge]
+            outside = border[edge]
+            self._triangle_adjacency[t, i] = outside
+            self._triangle_adjacency[outside, self._triangle_edges[outside].tolist().index(e)] = t
+            self._triangle_edges[t, i] = e
+            self._edge_triangles[e] = min(t, outside), max(t, outside)
+
+        # triangles and edges left over are replaced by the last ones
+        for slot in sorted(removed[len(new_triangles):], reverse=True):
+            last = self._triangles_n - 1
+            if slot != last:
+                for name in self.TRIANGLE_BUFFERS:
+                    buffer = getattr(self, name)
+                    buffer[slot] = buffer[last]
+                for a in self._triangle_adjacency[slot].tolist():
+                    self._triangle_adjacency[a][self._triangle_adjacency[a] == last] = slot
+                for e in self._triangle_edges[slot].tolist():
+                    self._edge_triangles[e] = np.sort(np.where(self._edge_triangles[e] == last, slot,
+                                                               self._edge_triangles[e]))
+                self._point_triangle[self._simplices[slot]] = slot
+                self._changed_points.update(self._simplices[slot].tolist())
+                self._changed_triangles.add(slot)
+                self._changed_triangles.update(self._triangle_adjacency[slot].tolist())
+                self._changed_edges.update(self._triangle_edges[slot].tolist())
+            self._triangles_n = last
+        for e in sorted(freed[len(inner):], reverse=True):
+            last = self._edges_n - 1
+            if e != last:
+                self._edges[e] = self._edges[last]
+                self._edge_triangles[e] = self._edge_triangles[last]
+                for t in self._edge_triangles[e].tolist():
+                    self._triangle_edges[t][self._triangle_edges[t] == last] = e
+                self._changed_edges.add(e)
+            self._edges_n = last
+
+    # lists patched by _refresh in rows of changed points, triangles and edges
+    POINT_LISTS = ['regressions_list', 'neighbours_list', 'triangles_by_points_list']
+    TRIANGLE_LISTS = ['simplices_list', 'areas_list', 'triangle_adjacency_list']
+    EDGE_LISTS = ['edge_triangles_list']
+
+    def _refresh(self):
+        """
+        Patches lists and indices of neighbours and triangles of points built before the change in the changed rows,
+        forgets the other variables built from the arrays, points are kept up to date by insert_points and
+        remove_points
+        """
+        points = sorted(p for p in self._changed_points if p < self._points_n)
+        triangles = sorted(t for t in self._changed_triangles if t < self._triangles_n)
+        edges = sorted(e for e in self._changed_edges if e < self._edges_n)
+        self._changed_points, self._changed_triangles, self._changed_edges = set(), set(), set()
+
+        stars = {p: sorted(self._star(p)) for p in points}
+        neighbours = {p: sorted({c for t in stars[p] for c in self._simplices[t].tolist()} - {p}) for p in points}
+        rows = dict(regressions_list=lambda p: float(self._regressions[p]), neighbours_list=neighbours.get,
+                    triangles_by_points_list=stars.get, simplices_list=lambda t: self._simplices[t].tolist(),
+                    areas_list=lambda t: float(self._areas[t]),
+                    triangle_adjacency_list=lambda t: self._triangle_adjacency[t].tolist(),
+                    edge_triangles_list=lambda e: self._edge_triangles[e].tolist())
+        for names, changed, rows_n in [(self.POINT_LISTS, points, self._points_n),
+                                       (self.TRIANGLE_LISTS, triangles, self._triangles_n),
+                                       (self.EDGE_LISTS, edges, self._edges_n)]:
+            for name in names:
+                if name not in self.__dict__:
+                    continue
+                values = self.__dict__[name]
+                del values[rows_n:]
+                values.extend([None] * (rows_n - len(values)))
+                for i in changed:
+                    values[i] = rows[name](i)
+
+        if '_neighbour_rows' in self.__dict__:
+            self._neighbour_rows = _patched_rows(*self._neighbour_rows, neighbours, self._points_n)
+        if '_point_triangle_rows' in self.__dict__:
+            self._point_triangle_rows = _patched_rows(*self._point_triangle_rows, stars, self._points_n)
+        for name in ['neighbour_indptr', 'neighbour_indices', 'point_triangle_indptr', 'point_triangle_indices']:
+            self.__dict__.pop(name, None)
+
+        patched = self.POINT_LISTS + self.TRIANGLE_LISTS + self.EDGE_LISTS + ['_neighbour_rows', '_point_triangle_rows']
+        for name, value in vars(DelaunayDiagram).items():
+            if isinstance(value, cached_property) and name != 'points' and name not in patched:
+                self.__dict__.pop(name, None)
+
+    def build_lists(self):
+        """
+        Builds lists and indices of neighbours and triangles of points PointsSet works with, so processes forked
+        afterwards share them instead of building their own
+        """
+        indices = ['neighbour_indptr', 'neighbour_indices', 'point_triangle_indptr', 'point_triangle_indices']
+        for name in self.POINT_LISTS + self.TRIANGLE_LISTS + self.EDGE_LISTS + indices:
+            getattr(self, name)
+
+    @cached_property
+    def fingerprint(self):
+        return coordinates_fingerprint(self.latitudes, self.longitudes)
+
+    @cached_property
+    def _neighbour_rows(self):
+        return _compressed_rows(np.concatenate([self.edges[:, 0], self.edges[:, 1]]),
+                                np.concatenate([self.edges[:, 1], self.edges[:, 0]]), self.points_n)
+
+    @cached_property
+    def neighbour_indptr(self):
+        return self._neighbour_rows[0]
+
+    @cached_property
+    def neighbour_indices(self):
+        return self._neighbour_rows[1]
+
+    @cached_property
+    def _point_triangle_rows(self):
+        return _compressed_rows(self.simplices.ravel(), np.repeat(np.arange(len(self.simplices)), 3), self.points_n)
+
+    @cached_property
+    def point_triangle_indptr(self):
+        return self._point_triangle_rows[0]
+
+    @cached_property
+    def point_triangle_indices(self):
+        return self._point_triangle_rows[1]
+
+    @cached_property
+    def points(self):
+        return self._table.to_points()
+
+    @property
+    def points_n(self):
+        return self._points_n
+
+    def triangle_index(self, *corners):
+        """
+        :param corners: three points, in any order
+        :return: index of the triangle they make, raises KeyError if they are not a triangle
+        """
+        a, b, c = sorted(self._indices[p] for p in corners)
+        for t in self.edge_triangles_list[self._edge_index[(a, b)]]:
+            if c in self.simplices_list[t]:
+                return t
+        raise KeyError(corners)
+
+    @cached_property
+    def _indices(self):
+        return {p: i for i, p in enumerate(self.points)}
+
+    @cached_property
+    def regressions_list(self):
+        return self.regressions.tolist()
+
+    @cached_property
+    def simplices_list(self):
+        return self.simplices.tolist()
+
+    @cached_property
+    def areas_list(self):
+        return self.areas.tolist()
+
+    @cached_property
+    def triangle_adjacency_list(self):
+        return self.triangle_adjacency.tolist()
+
+    @cached_property
+    def edge_triangles_list(self):
+        return self.edge_triangles.tolist()
+
+    @cached_property
+    def neighbours_list(self):
+        return [indices.tolist() for indices in np.split(self.neighbour_indices, self.neighbour_indptr[1:-1])]
+
+    @cached_property
+    def triangles_by_points_list(self):
+        return [indices.tolist() for indices in np.split(self.point_triangle_indices, self.point_triangle_indptr[1:-1])]
+
+    @cached_property
+    def _edge_index(self):
+        return {(a, b): e for e, (a, b) in enumerate(self.edges.tolist())}
+
+    @cached_property
+    def triangle_objects(self):
+        triangles = [Triangle(area, {self.points[v] for v in simplex})
+                     for area, simplex in zip(self.areas_list, self.simplices_list)]
+        for triangle, adjacent in zip(triangles, self.triangle_adjacency_list):
+            triangle.adjacent.update(triangles[t] for t in adjacent if t >= 0)
+        return triangles
+
+    @cached_property
+    def neighbours(self):
+        neighbours = {p: set() for p in self.points}
+        for a, b in self.edges.tolist():
+            neighbours[self.points[a]].add(self.points[b])
+            neighbours[self.points[b]].add(self.points[a])
+        return neighbours
+
+    @cached_property
+    def triangles_by_points(self):
+        triangles_by_points = {p: set() for p in self.points}
+        for triangle, simplex in zip(self.triangle_objects, self.simplices_list):
+            for v in simplex:
+                triangles_by_points[self.points[v]].add(triangle)
+        return triangles_by_points
+
+    @cached_property
+    def triangles(self):
+        return _TrianglesView(self)
+
+    @cached_property
+    def neighbours_making_triangles(self):
+        return _NeighboursMakingTrianglesView(self)
+
+
+class _TrianglesView(Mapping):
+    def __init__(self, diagram):
+        self._diagram = diagram
+
+    def __getitem__(self, corners):
+        return self._diagram.triangle_objects[self._diagram.triangle_index(*corners)]
+
+    def __iter__(self):
+        points = self._diagram.points
+        return (tuple(points[v] for v in simplex) for simplex in self._diagram.simplices_list)
+
+    def __len__(self):
+        return len(self._diagram.simplices)
+
+
+class _NeighboursMakingTrianglesView(Mapping):
+    def __init__(self, diagram):
+        self._diagram = diagram
+
+    def __getitem__(self, neighbours):
+        diagram = self._diagram
+        a, b = sorted(diagram._indices[p] for p in neighbours)
+        return {diagram.points[v]
+                for t in diagram.edge_triangles_list[diagram._edge_index[(a, b)]]
+                for v in diagram.simplices_list[t] if v != a and v != b}
+
+    def __iter__(self):
+        points = self._diagram.points
+        for a, b in self._diagram.edges.tolist():
+            yield points[a], points[b]
+            yield points[b], points[a]
+
+    def __len__(self):
+        return 2 * len(self._diagram.edges)
+
+
+def diagram_cache_file(points_file):
+    """
+    :return: name of the diagram's cache file for a .csv file with points
+    """
+    return os.path.splitext(points_file)[0] + '.diagram.npz'
+
+
+def coordinates_fingerprint(latitudes, longitudes):
+    """
+    :return: hash of points' coordinates, identifying their triangulation
+    """
+    sha = hashlib.sha1()
+    sha.update(np.ascontiguousarray(latitudes, dtype=float).tobytes())
+    sha.update(np.ascontiguousarray(longitudes, dtype=float).tobytes())
+    return sha.hexdigest()
+
+
+def spherical_triangles_areas(coordinates, simplices):
+    """
+    Areas of spherical triangles on the unit sphere, computed as solid angles (Van Oosterom and Strackee formula)
+
+    :param coordinates: (N, 3) array of cartesian coordinates of points on the unit sphere
+    :param simplices: (T, 3) array of indices of triangles' corners
+    :return: (T,) array of areas
+    """
+    a = coordinates[simplices[:, 0]]
+    b = coordinates[simplices[:, 1]]
+    c = coordinates[simplices[:, 2]]
+
+    triple_product = np.abs(np.einsum('ij,ij->i', a, np.cross(b, c)))
+    denominator = 1 + np.einsum('ij,ij->i', a, b) + np.einsum('ij,ij->i', b, c) + np.einsum('ij,ij->i', c, a)
+
+    return 2 * np.arctan2(triple_product, denominator)
+
+
+def _triangles_adjacency(simplices, points_n):
+    """
+    :param simplices: (T, 3) array of indices of triangles' corners of a closed surface
+    :param points_n: number of points
+    :return: edges, edge_triangles and triangle_adjacency arrays, as described in DelaunayDiagram, and (T, 3)
+    indices of edges of triangles, the i-th one joining corners i and (i + 1) % 3
+    """
+    # i-th edge of a triangle joins corners i and (i + 1) % 3
+    edges = np.sort(np.stack([simplices, np.roll(simplices, -1, axis=1)], axis=2).reshape(-1, 2), axis=1)
+    keys = edges[:, 0] * points_n + edges[:, 1]
+
+    order = np.argsort(keys, kind='stable')
+    first, second = order[0::2], order[1::2]
+    if len(first) != len(second) or np.any(keys[first] != keys[second]):
+        raise ValueError("Every edge of the triangulation has to be shared by exactly two triangles")
+
+    triangle_adjacency = np.full(simplices.shape, -1, dtype=np.int64)
+    triangle_adjacency.flat[first] = second // 3
+    triangle_adjacency.flat[second] = first // 3
+
+    triangle_edges = np.empty(simplices.shape, dtype=np.int64)
+    triangle_edges.flat[first] = triangle_edges.flat[second] = np.arange(len(first))
+
+    return edges[first], np.stack([first // 3, second // 3], axis=1), triangle_adjacency, triangle_edges
+
+
+def _fill_hole(coordinates, removed, border):
+    """
+    Triangulates the hole left in the diagram by a removed point. New triangles are faces of the convex hull of the
+    hole's border that face the removed point.
+
+    :param border: edges on the border of the hole, as pairs of ends
+    :return: list of corners of triangles
+    """
+    link = sorted({p for edge in border for p in edge})
+    if len(link) == 3:
+        return [tuple(link)]
+
+    try:
+        hull = scipy.spatial.ConvexHull(coordinates[link])
+        facing = hull.equations[:, :3] @ coordinates[removed] + hull.equations[:, 3] > 0
+        triangles = [tuple(link[i] for i in simplex) for simplex in hull.simplices[facing].tolist()]
+        if len(triangles) == len(link) - 2:
+            return triangles
+    except scipy.spatial.QhullError:
+        pass
+
+    # border's points lie on one circle, so any triangulation of the hole is a Delaunay one
+    following = {}
+    for a, b in border:
+        following.setdefault(a, []).append(b)
+        following.setdefault(b, []).append(a)
+    cycle = [link[0], following[link[0]][0]]
+    while len(cycle) < len(link):
+        a, b = following[cycle[-1]]
+        cycle.append(a if a != cycle[-2] else b)
+    return [(cycle[0], cycle[i], cycle[i + 1]) for i in range(1, len(cycle) - 1)]
+
+
+def _triple_product(a, b, c):
+    """
+    :return: a . (b x c) of 3-element lists
+    """
+    return (a[0] * (b[1] * c[2] - b[2] * c[1]) + a[1] * (b[2] * c[0] - b[0] * c[2])
+            + a[2] * (b[0] * c[1] - b[1] * c[0]))
+
+
+def _patched_rows(indptr, indices, changed, rows_n):
+    """
+    :param indptr, indices: compressed rows, as made by _compressed_rows
+    :param changed: dictionary of new columns of some rows
+    :param rows_n: number of rows after the change, rows beyond it are dropped and new ones are empty unless changed
+    :return: indptr and indices arrays with the rows replaced
+    """
+    old_n = min(rows_n, len(indptr) - 1)
+    counts = np.zeros(rows_n, dtype=np.int64)
+    counts[:old_n] = np.diff(indptr[:old_n + 1])
+    for row, columns in changed.items():
+        counts[row] = len(columns)
+    new_indptr = np.zeros(rows_n + 1, dtype=np.int64)
+    np.cumsum(counts, out=new_indptr[1:])
+
+    # runs of rows between the changed ones are copied at once
+    new_indices = np.empty(new_indptr[-1], dtype=indices.dtype)
+    start = 0
+    for row in sorted(changed) + [rows_n]:
+        a, b = min(start, old_n), min(row, old_n)
+        new_indices[new_indptr[a]:new_indptr[b]] = indices[indptr[a]:indptr[b]]
+        if row < rows_n:
+            new_indices[new_indptr[row]:new_indptr[row + 1]] = changed[row]
+        start = row + 1
+    return new_indptr, new_indices
+
+
+def _compressed_rows(rows, columns, rows_n):
+    """
+    :return: indptr and indices arrays, such that columns of row i are indices[indptr[i]:indptr[i + 1]]
+    """
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(rows_n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=rows_n), out=indptr[1:])
+    return indptr, columns[order]
 
 
 if __name__ == "__main__":
-    # print delaunay diagram's statistics for the first argument
+    # print delaunay diagram's statistics for the first argument, --cache keeps points and diagram next to it
     input_file = sys.argv[1]
-    points = point.load_from_csv(input_file)
+    cache = "--cache" in sys.argv[2:]
+    points = point.load_table_from_csv(input_file, cache=cache)
 
-    delaunay = DelaunayDiagram(points)
-    triangles = len(delaunay.triangles) / 6
-    total_area = sum(t.area for t in delaunay.triangles.values()) / 6
+    delaunay = DelaunayDiagram(points, cache_file=diagram_cache_file(input_file) if cache else None)
+    triangles = len(delaunay.simplices)
+    total_area = delaunay.areas.sum()
     average_area = total_area / triangles
-    median_area = median(t.area for t in delaunay.triangles.values())
-    max_area = max(t.area for t in delaunay.triangles.values())
-    min_area = min(t.area for t in delaunay.triangles.values())
+    median_area = np.median(delaunay.areas)
+    max_area = delaunay.areas.max()
+    min_area = delaunay.areas.min()
 
     print("""
     Total triangles: {}
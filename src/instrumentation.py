@@ -0,0 +1,135 @@
+import time
+
+
+MOVES = ['add', 'remove']
+
+
+class Observer:
+    """
+    Base class of SimulatedAnnealing observers, every method does nothing by default. Observers are called only when
+    at least one is attached, otherwise the annealing loop runs without any bookkeeping.
+    """
+
+    def started(self, simulated_annealing):
+        pass
+
+    def moved(self, kind, point, old_value, new_value, accepted, evaluation_time, move_time):
+        """
+        :param kind: 'add' or 'remove'
+        :param point: index of the proposed point
+        :param accepted: whether the move was made
+        :param evaluation_time: seconds spent computing new_value
+        :param move_time: seconds spent in add_point or remove_point, 0 for rejected moves
+        :return: None
+        """
+        pass
+
+    def iteration_finished(self, simulated_annealing):
+        pass
+
+    def finished(self, simulated_annealing):
+        pass
+
+
+class Statistics(Observer):
+    """
+    Counts proposed, accepted and rejected moves and measures where the time goes. Time of add_point and
+    remove_point includes refreshing removable points, which includes checks of points around the moved one by
+    _removability.
+    """
+
+    def __init__(self):
+        self.proposed = dict.fromkeys(MOVES, 0)
+        self.accepted = dict.fromkeys(MOVES, 0)
+        self.evaluation_time = 0.0
+        self.move_time = 0.0
+        self.removability_time = 0.0
+        self.can_remove_time = 0.0
+        self.can_remove_calls = 0
+        self.points_to_add_n = 0
+        self.points_to_remove_n = 0
+        self.max_points_to_add_n = 0
+        self.max_points_to_remove_n = 0
+        self.iterations = 0
+        self.elapsed = 0.0
+        self._start = None
+        self._points_set = None
+
+    def started(self, simulated_annealing):
+        self._start = time.perf_counter()
+        self.iterations = 0
+
+        # points set's methods are wrapped only for the run, so they cost nothing when statistics are not gathered
+        points_set = self._points_set = simulated_annealing.points_set
+        points_set._update_points_to_remove = self._timed(points_set._update_points_to_remove, 'removability_time')
+        points_set._removability = self._timed(points_set._removability, 'can_remove_time', 'can_remove_calls')
+
+    def _timed(self, method, time_attribute, calls_attribute=None):
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return method(*args)
+            finally:
+                setattr(self, time_attribute, getattr(self, time_attribute) + time.perf_counter() - start)
+                if calls_attribute is not None:
+                    setattr(self, calls_attribute, getattr(self, calls_attribute) + 1)
+        return timed
+
+    def moved(self, kind, point, old_value, new_value, accepted, evaluation_time, move_time):
+        self.proposed[kind] += 1
+        if accepted:
+            self.accepted[kind] += 1
+        self.evaluation_time += evaluation_time
+        self.move_time += move_time
+
+    def iteration_finished(self, simulated_annealing):
+        self.iterations += 1
+        self.points_to_add_n = len(self._points_set.points_to_add)
+        self.points_to_remove_n = len(self._points_set.points_to_remove)
+        self.max_points_to_add_n = max(self.max_points_to_add_n, self.points_to_add_n)
+        self.max_points_to_remove_n = max(self.max_points_to_remove_n, self.points_to_remove_n)
+
+    def finished(self, simulated_annealing):
+        self.elapsed += time.perf_counter() - self._start
+        del self._points_set._update_points_to_remove
+        del self._points_set._removability
+        self._points_set = None
+
+    @property
+    def rejected(self):
+        return {kind: self.proposed[kind] - self.accepted[kind] for kind in MOVES}
+
+    @property
+    def iterations_per_second(self):
+        return self.iterations / self.elapsed if self.elapsed > 0 else 0
+
+    def to_dict(self):
+        """
+        :return: flat dictionary of the statistics, e.g. for a row of results
+        """
+        statistics = {}
+        for kind in MOVES:
+            statistics['{}_proposed'.format(kind)] = self.proposed[kind]
+            statistics['{}_accepted'.format(kind)] = self.accepted[kind]
+            statistics['{}_rejected'.format(kind)] = self.rejected[kind]
+        statistics.update(evaluation_time=self.evaluation_time, move_time=self.move_time,
+                          removability_time=self.removability_time, can_remove_time=self.can_remove_time,
+                          can_remove_calls=self.can_remove_calls, points_to_add_n=self.points_to_add_n,
+                          points_to_remove_n=self.points_to_remove_n, max_points_to_add_n=self.max_points_to_add_n,
+                          max_points_to_remove_n=self.max_points_to_remove_n, elapsed=self.elapsed,
+                          iterations_per_second=self.iterations_per_second)
+        return statistics
+
+    def __str__(self):
+        lines = ["Moves:\tproposed\taccepted\trejected"]
+        for kind in MOVES:
+            lines.append("{}:\t{}\t{}\t{}".format(kind, self.proposed[kind], self.accepted[kind], self.rejected[kind]))
+        lines.append("Time:\tevaluation {:.3f}s\tmoves {:.3f}s\t(removability {:.3f}s, checks {:.3f}s in {} calls)"
+                     .format(self.evaluation_time, self.move_time, self.removability_time, self.can_remove_time,
+                             self.can_remove_calls))
+        lines.append("Frontier:\tto add {} (max {})\tto remove {} (max {})"
+                     .format(self.points_to_add_n, self.max_points_to_add_n, self.points_to_remove_n,
+                             self.max_points_to_remove_n))
+        lines.append("Iterations:\t{} in {:.3f}s\t{:.1f}/s".format(self.iterations, self.elapsed,
+                                                                   self.iterations_per_second))
+        return "\n".join(lines)
@@ -1,33 +1,47 @@
 import sys
-from datetime import datetime
 import statistics
+import time
 
+import numpy as np
 import pandas
-from scipy.stats import linregress
 
 import src.point as point
 
 
-def main():
-    if len(sys.argv) not in (3, 4):
-        exit("Invalid number of arguments. Input and output .csv files' names required, may be followed by cities csv")
+LOCATION = ["City", "Latitude", "Longitude"]
+COLUMNS = {"dt": str, "AverageTemperature": float, "City": str, "Latitude": str, "Longitude": str}
+
+# years are shifted by it before summing their squares, to keep the sums small
+REFERENCE_YEAR = 1900
 
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
 
-    data_frame = pandas.read_csv(input_file, usecols=["dt", "AverageTemperature", "City", "Latitude", "Longitude"])
-    data_by_location = data_frame.groupby(by=["City", "Latitude", "Longitude"], as_index=False)
-    data_by_location = data_by_location.apply(temperature_series_to_regression)
+def main():
+    options = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    argv = [arg for arg in sys.argv if not arg.startswith("--")]
+    if len(argv) not in (3, 4):
+        exit("Invalid number of arguments. Input and output .csv files' names required, may be followed by cities csv"
+             " and options: --verbose to print regression of each city, --chunksize=N to read input N rows at a time")
+
+    verbose = "--verbose" in options
+    chunksize = None
+    for option in options:
+        if option.startswith("--chunksize="):
+            chunksize = int(option[len("--chunksize="):])
+
+    input_file = argv[1]
+    output_file = argv[2]
+
+    data_by_location = sums_to_regressions(read_regression_sums(input_file, chunksize), verbose=verbose)
     data_by_location = data_by_location.reset_index()
 
-    if len(sys.argv) == 4:
-        cities_file = sys.argv[3]
+    if len(argv) == 4:
+        cities_file = argv[3]
         cities_data_frame = pandas.read_csv(cities_file, usecols=["AccentCity", "Latitude", "Longitude"],
                                             encoding="ISO-8859-1")
         cities_data_frame = cities_data_frame\
             .assign(acccity=lambda df: df['AccentCity'].str.lower())\
             .set_index('acccity')
-        data_by_location = data_by_location.apply(fix_cities_location, axis=1, cities_data_frame=cities_data_frame)
+        data_by_location = fix_cities_location(data_by_location, cities_data_frame, verbose=verbose)
 
     data_by_location = data_by_location.drop_duplicates(subset=["Latitude", "Longitude"])
     data_by_location.to_csv(output_file, header=True)
@@ -42,39 +56,113 @@ def main():
     print("Average regression: {}, median: {}".format(mean, median))
 
 
-def temperature_series_to_regression(temperatures: pandas.Series):
-    temperatures = temperatures.dropna()
-    regression = linregress(temperatures["dt"].map(map_date), temperatures["AverageTemperature"])[0]
-    print("{}: {}".format(list(temperatures["City"])[0], regression))
-    return pandas.Series(regression, index=["Regression"])
-
-
-def fix_cities_location(data_by_location, cities_data_frame):
-    city = data_by_location['City'].lower()
-    if city in cities_data_frame.index:
-        results = cities_data_frame.loc[[city]]
-        if results.shape[0] != 1:
-            print("{}: {} results".format(data_by_location['City'], results.shape[0]))
-            orig = point.Point(data_by_location['Latitude'], data_by_location['Longitude'])
-            results = results\
-                .assign(f=lambda r: [orig.dist(point.Point(lat, lon)) for lat, lon in zip(r.Latitude, r.Longitude)])\
-                .sort_values('f')\
-                .drop('f', axis=1)
-
-            print("Changed location from {}, {} to {}, {}".format(
-                data_by_location['Latitude'], data_by_location['Longitude'],
-                results.iloc[0]['Latitude'], results.iloc[0]['Longitude']))
-
-        data_by_location['Latitude'] = results.iloc[0]['Latitude']
-        data_by_location['Longitude'] = results.iloc[0]['Longitude']
-    else:
-        print("{}: no results".format(data_by_location['City']))
+def regression_sums(data_frame):
+    """
+    :param data_frame: DataFrame with dt, AverageTemperature, City, Latitude and Longitude columns
+    :return: DataFrame with sums needed for linear regression of temperature by year (n, x, y, xy, xx) for each
+    location
+    """
+    data_frame = data_frame.dropna(subset=["dt", "AverageTemperature"])
+    years = (map_dates(data_frame["dt"]) - REFERENCE_YEAR).astype(float)
+    temperatures = data_frame["AverageTemperature"].to_numpy(dtype=float)
+
+    sums = data_frame[LOCATION].assign(n=1, x=years, y=temperatures, xy=years * temperatures, xx=years * years)
+    return sums.groupby(by=LOCATION, as_index=False, sort=True).sum()
+
+
+def read_regression_sums(input_file, chunksize=None):
+    """
+    :param input_file: name of .csv file with temperatures
+    :param chunksize: if given, the file is read that many rows at a time, keeping only sums for each location
+    :return: DataFrame returned by regression_sums for the whole file
+    """
+    if chunksize is None:
+        return regression_sums(pandas.read_csv(input_file, usecols=list(COLUMNS), dtype=COLUMNS))
+
+    sums = None
+    rows = 0
+    start = time.time()
+    for chunk in pandas.read_csv(input_file, usecols=list(COLUMNS), dtype=COLUMNS, chunksize=chunksize):
+        chunk_sums = regression_sums(chunk)
+        if sums is None:
+            sums = chunk_sums
+        else:
+            sums = pandas.concat([sums, chunk_sums]).groupby(by=LOCATION, as_index=False, sort=True).sum()
+
+        rows += len(chunk)
+        print("Read {} rows, {} locations, {:.0f} rows/s".format(rows, len(sums), rows / (time.time() - start)))
+
+    return sums
+
+
+def sums_to_regressions(sums, verbose=False):
+    """
+    :param sums: DataFrame returned by regression_sums
+    :param verbose: print regression of each city
+    :return: DataFrame with City, Latitude, Longitude and Regression columns
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        regressions = (sums["n"] * sums["xy"] - sums["x"] * sums["y"]) / (sums["n"] * sums["xx"] - sums["x"] ** 2)
+
+    result = sums[LOCATION].assign(Regression=regressions)
+    if verbose:
+        for city, regression in zip(result["City"], result["Regression"]):
+            print("{}: {}".format(city, regression))
+
+    return result
+
+
+def fix_cities_location(data_by_location, cities_data_frame, verbose=False):
+    """
+    Moves every location to the city of the same name, the closest one if there are many of them
+
+    :param data_by_location: DataFrame with City, Latitude and Longitude columns
+    :param cities_data_frame: DataFrame with Latitude and Longitude columns, indexed by lowercase city name
+    :param verbose: print changes of each city
+    :return: DataFrame with fixed locations
+    """
+    locations = pandas.DataFrame({"location": np.arange(len(data_by_location)),
+                                  "name": data_by_location["City"].str.lower().to_numpy(),
+                                  "latitude": point.geo_coords_str_to_float(data_by_location["Latitude"], 'N', 'S'),
+                                  "longitude": point.geo_coords_str_to_float(data_by_location["Longitude"], 'E', 'W')})
+    candidates = locations.merge(cities_data_frame[["Latitude", "Longitude"]], left_on="name", right_index=True)\
+        .reset_index(drop=True)
+    candidates["distance"] = point.haversine_distances(candidates["latitude"].to_numpy(),
+                                                       candidates["longitude"].to_numpy(),
+                                                       candidates["Latitude"].to_numpy(),
+                                                       candidates["Longitude"].to_numpy())
+
+    results_n = candidates.groupby("location").size()
+    closest = candidates.loc[candidates.groupby("location")["distance"].idxmin()]
+
+    if verbose:
+        cities = data_by_location["City"].to_numpy()
+        for c in closest.itertuples():
+            if results_n[c.location] != 1:
+                print("{}: {} results".format(cities[c.location], results_n[c.location]))
+                print("Changed location from {}, {} to {}, {}".format(
+                    data_by_location["Latitude"].iloc[c.location], data_by_location["Longitude"].iloc[c.location],
+                    c.Latitude, c.Longitude))
+        for location in np.setdiff1d(locations["location"], closest["location"]):
+            print("{}: no results".format(cities[location]))
+
+    print("Cities found: {}, with many results: {}, not found: {}".format(
+        len(closest), (results_n != 1).sum(), len(data_by_location) - len(closest)))
+
+    data_by_location = data_by_location.astype({"Latitude": object, "Longitude": object})
+    rows = closest["location"].to_numpy()
+    data_by_location.iloc[rows, data_by_location.columns.get_loc("Latitude")] = closest["Latitude"].to_numpy()
+    data_by_location.iloc[rows, data_by_location.columns.get_loc("Longitude")] = closest["Longitude"].to_numpy()
 
     return data_by_location
 
 
-def map_date(date_string):
-    return datetime.strptime(date_string, "%Y-%M-%d").year
+def map_dates(date_strings):
+    """
+    :param date_strings: Series of dates in YYYY-MM-DD format
+    :return: array of years
+    """
+    return date_strings.str.slice(0, 4).astype(int).to_numpy()
 
 
 def count_stats(data):
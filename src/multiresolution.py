@@ -0,0 +1,177 @@
+from src.delaunay_diagram import DelaunayDiagram
+from src.points_set import PointsSet
+from src.simulated_annealing import SimulatedAnnealing
+from src.components import EligibleComponents, connected_region, triangle_components
+from src.cooling import Geometric
+import src.point as point
+
+import numpy as np
+
+import math
+import os
+
+
+def grid_cells(latitudes, longitudes, cell_size):
+    """
+    Cells of a spherical grid of roughly equal areas: bands of cell_size degrees of latitude, each one divided into
+    as many cells as fit in the length of its middle parallel
+
+    :param latitudes, longitudes: arrays of coordinates in degrees
+    :param cell_size: size of a cell in degrees
+    :return: (N,) index of every point's cell
+    """
+    bands_n = int(math.ceil(180 / cell_size))
+    bands = np.minimum(((np.asarray(latitudes) + 90) / cell_size).astype(np.int64), bands_n - 1)
+    middles = np.radians(np.minimum(-90 + (np.arange(bands_n) + 0.5) * cell_size, 90))
+    cells_n = np.maximum(1, np.round(360 / cell_size * np.cos(middles))).astype(np.int64)
+    columns = np.minimum(((np.asarray(longitudes) + 180) / 360 * cells_n[bands]).astype(np.int64),
+                         cells_n[bands] - 1)
+    first_cells = np.concatenate([[0], np.cumsum(cells_n)[:-1]])
+    return first_cells[bands] + columns
+
+
+def coarsen(delaunay_diagram, cell_size):
+    """
+    Clusters points into cells of grid_cells, every cluster is represented by a point at its centroid with the mean
+    regression of its points
+
+    :return: DelaunayDiagram of the clusters and (N,) index of every point's cluster
+    """
+    _, clusters = np.unique(grid_cells(delaunay_diagram.latitudes, delaunay_diagram.longitudes, cell_size),
+                            return_inverse=True)
+    clusters_n = clusters.max() + 1
+    sizes = np.bincount(clusters, minlength=clusters_n)
+
+    centroids = np.stack([np.bincount(clusters, weights=c, minlength=clusters_n)
+                          for c in delaunay_diagram.coordinates.T], axis=1)
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    latitudes = np.degrees(np.arcsin(np.clip(centroids[:, 2], -1, 1)))
+    longitudes = np.degrees(np.arctan2(centroids[:, 0], centroids[:, 1]))
+    regressions = np.bincount(clusters, weights=delaunay_diagram.regressions, minlength=clusters_n) / sizes
+
+    table = point.PointsTable(['cluster {} ({} points)'.format(i, n) for i, n in enumerate(sizes.tolist())],
+                              latitudes, longitudes, regressions)
+    return DelaunayDiagram(table), clusters
+
+
+def warm_start(delaunay_diagram, target, minimal_point_density, minimal_regression):
+    """
+    Points set of the part of target points with regression above minimal, whose triangles are connected through
+    common edges, with the largest area
+
+    :param target: (N,) boolean mask of points the set may contain
+    :return: PointsSet, None if target points with regression above minimal make no triangle
+    """
+    eligible = target & (delaunay_diagram.regressions > minimal_regression)
+    inside = eligible[delaunay_diagram.simplices].all(axis=1)
+    if not inside.any():
+        return None
+
+    components, _ = triangle_components(delaunay_diagram, inside)
+    largest = np.bincount(components[inside], weights=delaunay_diagram.areas[inside]).argmax()
+
+    # corners of the component may make triangles of other components, which a points set of them would contain
+    points = connected_region(delaunay_diagram, np.unique(delaunay_diagram.simplices[components == largest]))
+    if len(points) == 0:
+        return None
+    return PointsSet.from_points(delaunay_diagram, points, minimal_point_density, minimal_regression)
+
+
+class MultiResolution:
+    """
+    Coarsen-then-refine: simulated annealing runs first on a diagram of clusters of points, where a single move adds
+    or removes a whole cell of the grid. Points of the best clusters make a warm start of a shorter run on the full
+    diagram, which only adjusts the region's border.
+
+    Minimal density on the coarse diagram is scaled by the mean number of points in a cluster, so a cluster counts
+    as many points as it has on average.
+    """
+
+    def __init__(self, delaunay_diagram, minimal_point_density, minimal_regression, cell_size=5.0, temperature=1.0,
+                 refine_temperature=None, coarse_iterations=10000, max_iterations=10000, seed=1, cooling=None,
+                 promising_fraction=0.1, components=None, **parameters):
+        """
+        :param cell_size: size of cells of the coarse grid in degrees
+        :param temperature: starting temperature of the coarse run
+        :param refine_temperature: starting temperature of the run on the full diagram, a tenth of temperature by
+        default, so the warm start is refined rather than left
+        :param coarse_iterations: iterations of the coarse run
+        :param max_iterations: iterations of the run on the full diagram
+        :param cooling: function making a CoolingSchedule from starting temperature, Geometric by default
+        :param promising_fraction: the coarse run starts in a component of clusters, whose highest possible value is
+        at least that part of the highest one
+        :param components: EligibleComponents of the full diagram, bounding the value of the refined run
+        :param parameters: other parameters of both runs of SimulatedAnnealing
+        """
+        self._delaunay = delaunay_diagram
+        self._minimal_point_density = minimal_point_density
+        self._minimal_regression = minimal_regression
+        self._cell_size = cell_size
+        self._temperature = temperature
+        self._refine_temperature = refine_temperature if refine_temperature is not None else temperature / 10
+        self._coarse_iterations = coarse_iterations
+        self._max_iterations = max_iterations
+        self._seed = seed
+        self._cooling = cooling if cooling is not None else Geometric
+        self._promising_fraction = promising_fraction
+        self._components = components
+        self._parameters = parameters
+
+        self.coarse_diagram = None
+        self.clusters = None
+        self.coarse = None
+        self.fine = None
+
+    def calculate(self):
+        """
+        :return: final PointsSet of the run on the full diagram and indices of its best points
+        """
+        self.coarse_diagram, self.clusters = coarsen(self._delaunay, self._cell_size)
+        coarse_density = self._minimal_point_density * self.coarse_diagram.points_n / self._delaunay.points_n
+        print("Coarse diagram: {} clusters of {} points".format(self.coarse_diagram.points_n, self._delaunay.points_n))
+
+        components = EligibleComponents(self.coarse_diagram, self._minimal_regression)
+        if len(components) == 0:
+            raise ValueError("No cluster has mean regression above {}".format(self._minimal_regression))
+        candidates = components.points(components.promising(coarse_density, self._promising_fraction))
+        initial_point = int(np.random.default_rng(self._seed).choice(candidates))
+
+        coarse_set = PointsSet(self.coarse_diagram, initial_point, coarse_density, self._minimal_regression)
+        self.coarse = SimulatedAnnealing(coarse_set, temperature=self._temperature,
+                                         max_iterations=self._coarse_iterations, seed=self._seed,
+                                         cooling=self._cooling(self._temperature),
+                                         value_bound=components.value_bound(initial_point, coarse_density),
+                                         **self._parameters)
+        _, coarse_best = self.coarse.calculate()
+        if len(coarse_best) == 0:
+            coarse_best = coarse_set.points
+
+        points_set = warm_start(self._delaunay, np.isin(self.clusters, coarse_best), self._minimal_point_density,
+                                self._minimal_regression)
+        if points_set is None:
+            raise ValueError("Best clusters have no point with regression above {}".format(self._minimal_regression))
+        print("Warm start: {} clusters projected to {} points, value {}".format(len(coarse_best), points_set.points_n,
+                                                                           points_set.value))
+
+        value_bound = None
+        if self._components is not None:
+            value_bound = self._components.value_bound(points_set.points[0], self._minimal_point_density)
+        self.fine = SimulatedAnnealing(points_set, temperature=self._refine_temperature,
+                                       max_iterations=self._max_iterations, seed=self._seed,
+                                       cooling=self._cooling(self._refine_temperature), value_bound=value_bound,
+                                       **self._parameters)
+        return self.fine.calculate()
+
+    def save_history(self, filename=None):
+        """
+        Saves histories of both runs, the coarse one with 'coarse-' prefix
+        """
+        if filename is None:
+            filename = '../out/mr-t-{}-s-{}.csv'.format(self._temperature, self._seed)
+        directory, name = os.path.split(filename)
+        self.coarse.save_history(os.path.join(directory, 'coarse-' + name))
+        self.fine.save_history(filename)
+
+    @property
+    def max_value(self):
+        return self.fine.max_value
@@ -0,0 +1,184 @@
+from src.points_set import PointsSet
+from src.simulated_annealing import SimulatedAnnealing, History
+from src.cooling import Constant
+
+import numpy as np
+
+import math
+import multiprocessing
+import signal
+
+
+def temperature_ladder(cold, hot, replicas):
+    """
+    :return: replicas temperatures from cold to hot in geometric progression
+    """
+    if replicas == 1:
+        return [cold]
+    return np.geomspace(cold, hot, replicas).tolist()
+
+
+class ParallelTempering:
+    """
+    Replica exchange: chains of simulated annealing run at constant temperatures of a ladder, each one in its own
+    process forked from this one, so they share the diagram. Every swap_interval iterations chains at neighbouring
+    temperatures exchange them with Metropolis probability, letting a region found by a hot chain be refined by a
+    cold one.
+    """
+
+    def __init__(self, delaunay_diagram, initial_point, minimal_point_density, minimal_regression, temperatures,
+                 max_iterations=100000, swap_interval=100, seed=1, log_interval=1, value_bound=None):
+        """
+        :param temperatures: temperatures of chains, in ascending order
+        :param max_iterations: iterations of every chain
+        :param swap_interval: iterations between swaps
+        :param log_interval: print state every that many swaps, 0 turns printing off
+        :param value_bound: highest value the set can reach, a chain reaching it stops
+        """
+        self._delaunay = delaunay_diagram
+        self._initial_point = initial_point
+        self._minimal_point_density = minimal_point_density
+        self._minimal_regression = minimal_regression
+        self._temperatures = list(temperatures)
+
+        self._max_iterations = max_iterations
+        self._swap_interval = swap_interval
+        self._iterations = 0
+        self._log_interval = log_interval
+        self._value_bound = value_bound
+        self._time_to_stop = False
+
+        self._seed = seed
+        sequences = np.random.SeedSequence(seed).spawn(len(self._temperatures) + 1)
+        self._chain_seeds = [int(sequence.generate_state(1)[0]) for sequence in sequences[1:]]
+        self._random = np.random.default_rng(sequences[0])
+
+        # chain at every temperature
+        self._chains = list(range(len(self._temperatures)))
+        self._swaps_proposed = np.zeros(len(self._temperatures) - 1, dtype=np.int64)
+        self._swaps_accepted = np.zeros(len(self._temperatures) - 1, dtype=np.int64)
+
+        self._max_value = 0
+        self._best_points = np.empty(0, dtype=np.int64)
+        self._history = History(max_iterations, swap_interval)
+
+    def _chain(self, connection, seed):
+        """
+        Runs in a worker process, every message is a temperature for the next swap_interval iterations, None ends it
+        """
+        points_set = PointsSet(self._delaunay, self._initial_point, self._minimal_point_density,
+                               self._minimal_regression)
+        cooling = Constant(self._temperatures[0])
+        simulated_annealing = SimulatedAnnealing(points_set, temperature=cooling.t0,
+                                                 max_iterations=self._max_iterations, seed=seed,
+                                                 history_interval=self._max_iterations, log_interval=0,
+                                                 cooling=cooling, value_bound=self._value_bound)
+        while True:
+            temperature = connection.recv()
+            if temperature is None:
+                break
+            cooling.t0 = simulated_annealing.temperature = temperature
+            simulated_annealing.calculate(self._swap_interval)
+            connection.send((points_set.value, points_set.area, simulated_annealing.max_value,
+                             simulated_annealing.best_points, simulated_annealing.time_to_stop))
+        connection.close()
+
+    def __signal_handler(self, signal, frame):
+        # chains get the signal too and stop their iterations
+        print('Algorithm manually stopped.')
+        self._time_to_stop = True
+
+    def _swap(self, values, offset):
+        """
+        Proposes swaps of chains at temperatures k and k + 1 for every k of given parity
+        """
+        for k in range(offset, len(self._temperatures) - 1, 2):
+            cold, hot = self._chains[k], self._chains[k + 1]
+            self._swaps_proposed[k] += 1
+            # chains maximize the value, so it is a negative energy
+            exponent = (values[hot] - values[cold]) * (1 / self._temperatures[k] - 1 / self._temperatures[k + 1])
+            if exponent >= 0 or self._random.random() < math.exp(exponent):
+                self._chains[k], self._chains[k + 1] = hot, cold
+                self._swaps_accepted[k] += 1
+
+    def calculate(self):
+        """
+        :return: best value and indices of the best points of all chains
+        """
+        self._delaunay.build_lists()
+        context = multiprocessing.get_context('fork')
+        connections, processes = [], []
+        for seed in self._chain_seeds:
+            connection, chain_connection = context.Pipe()
+            process = context.Process(target=self._chain, args=(chain_connection, seed), daemon=True)
+            process.start()
+            connections.append(connection)
+            processes.append(process)
+
+        signal.signal(signal.SIGINT, self.__signal_handler)
+        try:
+            rounds = 0
+            while self._iterations < self._max_iterations and not self._time_to_stop:
+                for k, chain in enumerate(self._chains):
+                    connections[chain].send(self._temperatures[k])
+                results = [connection.recv() for connection in connections]
+                self._iterations = min(self._iterations + self._swap_interval, self._max_iterations)
+
+                for value, area, max_value, best_points, _ in results:
+                    if max_value > self._max_value:
+                        self._max_value = max_value
+                        self._best_points = best_points
+
+                values = [value for value, _, _, _, _ in results]
+                self._swap(values, rounds % 2)
+                rounds += 1
+
+                coldest = results[self._chains[0]]
+                self._history.record(self._iterations, coldest[1], coldest[0], self._max_value, force=True)
+                if self._log_interval > 0 and rounds % self._log_interval == 0:
+                    self.log(values)
+                if self._value_bound is not None and self._max_value >= self._value_bound * (1 - 1e-9):
+                    print('Highest possible value reached.')
+                    break
+                if all(stopped for _, _, _, _, stopped in results):
+                    print('All chains stopped.')
+                    break
+        finally:
+            for connection in connections:
+                connection.send(None)
+            for process in processes:
+                process.join()
+
+        return self._max_value, self._best_points
+
+    def log(self, values):
+        print("{}/{}:\tMax Value\t{}\tValues by temperature\t{}".format(
+            self._iterations, self._max_iterations, self._max_value,
+            ' '.join('{:.6g}'.format(values[chain]) for chain in self._chains)))
+
+    def save_history(self, filename=None):
+        """
+        Saves area and value of the coldest chain and the max value of all chains after every swap
+        """
+        if filename is None:
+            filename = '../out/pt-t-{}-s-{}.csv'.format(self._temperatures[0], self._seed)
+        self._history.to_data_frame().to_csv(filename)
+
+    @property
+    def swap_acceptance(self):
+        """
+        :return: part of accepted swaps between temperatures k and k + 1
+        """
+        return self._swaps_accepted / np.maximum(self._swaps_proposed, 1)
+
+    @property
+    def temperatures(self):
+        return self._temperatures
+
+    @property
+    def max_value(self):
+        return self._max_value
+
+    @property
+    def best_points(self):
+        return self._best_points
@@ -0,0 +1,223 @@
+from src.points_set import PointsSet
+from src.simulated_annealing import SimulatedAnnealing
+from src.components import connected_region, triangle_components
+from src.cooling import Geometric
+
+import numpy as np
+import scipy.sparse
+
+import multiprocessing
+import os
+import signal
+
+
+def partition(coordinates, tiles_n):
+    """
+    Splits points recursively: the tile with most points is halved at the median of the coordinate it spreads most
+    along, so 8 tiles of evenly spread points are close to octants
+
+    :param coordinates: (N, 3) cartesian coordinates of points
+    :return: (N,) tile of every point
+    """
+    tiles = np.zeros(len(coordinates), dtype=np.int64)
+    for new_tile in range(1, tiles_n):
+        largest = np.bincount(tiles).argmax()
+        members = np.flatnonzero(tiles == largest)
+        if len(members) < 2:
+            break
+        spread = coordinates[members]
+        axis = (spread.max(axis=0) - spread.min(axis=0)).argmax()
+        upper = spread[:, axis] > np.median(spread[:, axis])
+        tiles[members[upper]] = new_tile
+    return tiles
+
+
+def with_halo(delaunay_diagram, tile, halo):
+    """
+    :param tile: (N,) boolean mask of points
+    :param halo: number of rings of neighbours added around the tile
+    :return: (N,) boolean mask of the tile and its halo
+    """
+    points_n = delaunay_diagram.points_n
+    neighbours = scipy.sparse.csr_matrix((np.ones(len(delaunay_diagram.neighbour_indices), dtype=bool),
+                                          delaunay_diagram.neighbour_indices, delaunay_diagram.neighbour_indptr),
+                                         shape=(points_n, points_n))
+    tile = tile.copy()
+    for _ in range(halo):
+        tile |= neighbours @ tile
+    return tile
+
+
+def merge_regions(delaunay_diagram, regions, minimal_point_density, minimal_regression):
+    """
+    Regions touching across tiles' boundaries are merged: triangles of the union of regions connected through common
+    edges make a single region
+
+    :param regions: list of arrays of points' indices
+    :return: list of PointsSets of merged regions, from the highest value
+    """
+    points = np.zeros(delaunay_diagram.points_n, dtype=bool)
+    for region in regions:
+        points[region] = True
+    inside = points[delaunay_diagram.simplices].all(axis=1)
+    components, components_n = triangle_components(delaunay_diagram, inside)
+
+    # corners of a component may make triangles of other components, which a points set of them would contain
+    merged = [connected_region(delaunay_diagram, np.unique(delaunay_diagram.simplices[components == c]))
+              for c in range(components_n)]
+    merged = [PointsSet.from_points(delaunay_diagram, points, minimal_point_density, minimal_regression)
+              for points in merged if len(points) > 0]
+    return sorted(merged, key=lambda points_set: points_set.value, reverse=True)
+
+
+class PartitionedAnnealing:
+    """
+    The diagram is split into tiles with overlapping halos and an independent chain of simulated annealing runs in
+    every tile, in processes forked from this one, so they share the diagram. Far apart regions do not interact, so
+    chains in tiles explore the globe at once. Regions found in neighbouring tiles that touch are merged and the best
+    merged region is refined by a short run on the whole diagram.
+    """
+
+    def __init__(self, delaunay_diagram, minimal_point_density, minimal_regression, tiles=8, halo=3,
+                 temperature=1.0, max_iterations=10000, refine_iterations=1000, seed=1, processes=None, cooling=None,
+                 components=None, promising_fraction=0.1, tile_log_interval=0, **parameters):
+        """
+        :param tiles: number of tiles
+        :param halo: rings of neighbours a tile's chain can reach beyond it
+        :param max_iterations: iterations of every tile's chain
+        :param refine_iterations: iterations of the run refining the best merged region, 0 turns it off
+        :param processes: number of processes running tiles' chains, all cores by default
+        :param cooling: function making a CoolingSchedule from starting temperature, Geometric by default
+        :param components: EligibleComponents of the diagram, chains start in their promising components and
+        value of the refining run is bounded by them
+        :param promising_fraction: part of the highest bound of all components a promising one has to reach
+        :param tile_log_interval: print state of tiles' chains every that many iterations, 0 turns printing off
+        :param parameters: other parameters of SimulatedAnnealing runs
+        """
+        self._delaunay = delaunay_diagram
+        self._minimal_point_density = minimal_point_density
+        self._minimal_regression = minimal_regression
+        self._halo = halo
+        self._temperature = temperature
+        self._max_iterations = max_iterations
+        self._refine_iterations = refine_iterations
+        self._seed = seed
+        self._processes = min(processes if processes is not None else os.cpu_count(), tiles)
+        self._cooling = cooling if cooling is not None else Geometric
+        self._components = components
+        self._promising_fraction = promising_fraction
+        self._tile_log_interval = tile_log_interval
+        self._parameters = parameters
+        self._time_to_stop = False
+
+        self.tiles = partition(delaunay_diagram.coordinates, tiles)
+        self._tiles_n = self.tiles.max() + 1
+        sequences = np.random.SeedSequence(seed).spawn(self._tiles_n)
+        self._tile_seeds = [int(sequence.generate_state(1)[0]) for sequence in sequences]
+
+        self.tile_values = np.zeros(self._tiles_n)
+        self.regions = []
+        self.refined = None
+
+    def _initial_point(self, tile, rng):
+        """
+        :return: random eligible point of the tile, from a promising component if there is one, None if no point of
+        the tile is eligible
+        """
+        eligible = (self.tiles == tile) & (self._delaunay.regressions > self._minimal_regression)
+        if self._components is not None:
+            promising = np.isin(self._components.labels, self._components.promising(self._minimal_point_density,
+                                                                                     self._promising_fraction))
+            if (eligible & promising).any():
+                eligible &= promising
+        candidates = np.flatnonzero(eligible)
+        return int(rng.choice(candidates)) if len(candidates) > 0 else None
+
+    def _run_tile(self, tile):
+        """
+        :return: max value and indices of the best points of the tile's chain
+        """
+        seed = self._tile_seeds[tile]
+        initial_point = self._initial_point(tile, np.random.default_rng(seed))
+        if initial_point is None:
+            return 0, np.empty(0, dtype=np.int64)
+
+        points_set = PointsSet(self._delaunay, initial_point, self._minimal_point_density, self._minimal_regression,
+                               allowed=with_halo(self._delaunay, self.tiles == tile, self._halo))
+        simulated_annealing = SimulatedAnnealing(points_set, temperature=self._temperature,
+                                                 max_iterations=self._max_iterations, seed=seed,
+                                                 cooling=self._cooling(self._temperature),
+                                                 **dict(self._parameters, log_interval=self._tile_log_interval))
+        simulated_annealing.calculate()
+        return simulated_annealing.max_value, simulated_annealing.best_points
+
+    def _worker(self, connection, tiles):
+        connection.send([(tile, *self._run_tile(tile)) for tile in tiles])
+        connection.close()
+
+    def __signal_handler(self, signal, frame):
+        # chains get the signal too, they stop and send their best regions
+        print('Algorithm manually stopped.')
+        self._time_to_stop = True
+
+    def calculate(self):
+        """
+        :return: final PointsSet of the refining run and indices of its best points, the best merged region when
+        refining is turned off or the run was stopped
+        """
+        self._delaunay.build_lists()
+        context = multiprocessing.get_context('fork')
+        connections, processes = [], []
+        for k in range(self._processes):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=self._worker,
+                                      args=(worker_connection, list(range(k, self._tiles_n, self._processes))),
+                                      daemon=True)
+            process.start()
+            connections.append(connection)
+            processes.append(process)
+
+        signal.signal(signal.SIGINT, self.__signal_handler)
+        results = []
+        for connection in connections:
+            results.extend(connection.recv())
+        for process in processes:
+            process.join()
+
+        for tile, max_value, best_points in results:
+            self.tile_values[tile] = max_value
+        print("Values by tile:", *('{:.6g}'.format(value) for value in self.tile_values))
+
+        self.regions = merge_regions(self._delaunay, [best_points for _, _, best_points in results],
+                                     self._minimal_point_density, self._minimal_regression)
+        if len(self.regions) == 0:
+            raise ValueError("No tile found a region with regression above {}".format(self._minimal_regression))
+        best = self.regions[0]
+        print("Merged {} regions of tiles into {}, the best has {} points, value {}".format(
+            sum(len(best_points) > 0 for _, _, best_points in results), len(self.regions), best.points_n, best.value))
+
+        if self._refine_iterations == 0 or self._time_to_stop:
+            return best, best.points
+
+        value_bound = None
+        if self._components is not None:
+            value_bound = self._components.value_bound(best.points[0], self._minimal_point_density)
+        self.refined = SimulatedAnnealing(best, temperature=self._temperature / 10,
+                                          max_iterations=self._refine_iterations, seed=self._seed,
+                                          cooling=self._cooling(self._temperature / 10), value_bound=value_bound,
+                                          **self._parameters)
+        return self.refined.calculate()
+
+    def save_history(self, filename=None):
+        """
+        Saves history of the refining run
+        """
+        if self.refined is None:
+            return
+        if filename is None:
+            filename = '../out/pa-t-{}-s-{}.csv'.format(self._temperature, self._seed)
+        self.refined.save_history(filename)
+
+    @property
+    def max_value(self):
+        return self.refined.max_value if self.refined is not None else self.regions[0].value
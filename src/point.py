@@ -1,8 +1,14 @@
+import math
+import os
+
 import pandas
 import numpy as np
+import scipy.spatial
 
 
 class Point:
+    __slots__ = ('latitude', 'longitude', 'regression', 'label')
+
     def __init__(self, latitude, longitude, regression=0, label=""):
         self.latitude = _geo_coord_str_to_float(latitude, 'N', 'S') if type(latitude) is str else float(latitude)
         self.longitude = _geo_coord_str_to_float(longitude, 'E', 'W') if type(longitude) is str else float(longitude)
@@ -11,9 +17,11 @@ class Point:
         self.label = label
 
     def get_cartesian_coordinates(self, center, radius):
-        x = center[0] + radius * np.cos(self.latitude * np.pi / 180) * np.sin(self.longitude * np.pi / 180)
-        y = center[1] + radius * np.cos(self.latitude * np.pi / 180) * np.cos(self.longitude * np.pi / 180)
-        z = center[2] + radius * np.sin(self.latitude * np.pi / 180)
+        latitude = math.radians(self.latitude)
+        longitude = math.radians(self.longitude)
+        x = center[0] + radius * math.cos(latitude) * math.sin(longitude)
+        y = center[1] + radius * math.cos(latitude) * math.cos(longitude)
+        z = center[2] + radius * math.sin(latitude)
 
         return x, y, z
 
@@ -22,16 +30,16 @@ class Point:
         :param point: a Point
         :return: a Haversine distance between points in radians
         """
-        lat1 = self.latitude * np.pi / 180
-        lon1 = self.longitude * np.pi / 180
-        lat2 = point.latitude * np.pi / 180
-        lon2 = point.longitude * np.pi / 180
+        lat1 = math.radians(self.latitude)
+        lon1 = math.radians(self.longitude)
+        lat2 = math.radians(point.latitude)
+        lon2 = math.radians(point.longitude)
 
         dlat = lat2 - lat1
         dlon = lon2 - lon1
 
-        a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
-        return 2 * np.arcsin(np.sqrt(a))
+        a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+        return 2 * math.asin(math.sqrt(a))
 
     def __str__(self):
         return "{}\t{}\t{}".format(
@@ -55,8 +63,132 @@ def _geo_coord_float_to_str(coord, positive, negative):
     return str(abs(coord)) + (positive if coord >= 0 else negative)
 
 
-def load_from_csv(filename):
-    dataframe = pandas.read_csv(filename)
+def geo_coords_str_to_float(coords, positive, negative):
+    """
+    Vectorized version of conversion of coordinates like 52.24N
+
+    :param coords: Series of coordinates, either numbers or strings ending with positive or negative direction
+    :return: array of coordinates as floats
+    """
+    if coords.dtype.kind in 'iuf':
+        return coords.to_numpy(dtype=float)
+
+    coords = coords.astype(str)
+    signs = np.where(coords.str.endswith(negative), -1.0, 1.0)
+    return signs * coords.str.rstrip(positive + negative).astype(float).to_numpy()
+
+
+def cartesian_coordinates(latitudes, longitudes, center=(0, 0, 0), radius=1):
+    """
+    Vectorized version of Point.get_cartesian_coordinates
+
+    :param latitudes, longitudes: arrays of coordinates in degrees
+    :return: (N, 3) array of cartesian coordinates
+    """
+    latitudes = np.radians(latitudes)
+    longitudes = np.radians(longitudes)
+    return np.asarray(center, dtype=float) + radius * np.stack([np.cos(latitudes) * np.sin(longitudes),
+                                                                np.cos(latitudes) * np.cos(longitudes),
+                                                                np.sin(latitudes)], axis=-1)
+
+
+def haversine_distances(latitudes1, longitudes1, latitudes2, longitudes2):
+    """
+    Vectorized version of Point.dist, one point against many can be given as scalars
+
+    :param latitudes1, longitudes1, latitudes2, longitudes2: arrays of coordinates in degrees, broadcast together
+    :return: array of Haversine distances between points in radians
+    """
+    lat1 = np.radians(latitudes1)
+    lon1 = np.radians(longitudes1)
+    lat2 = np.radians(latitudes2)
+    lon2 = np.radians(longitudes2)
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def pairwise_haversine_distances(latitudes1, longitudes1, latitudes2, longitudes2):
+    """
+    :return: (N, M) array of Haversine distances in radians between N points given first and M points given second
+    """
+    return haversine_distances(np.asarray(latitudes1)[:, np.newaxis], np.asarray(longitudes1)[:, np.newaxis],
+                               np.asarray(latitudes2)[np.newaxis, :], np.asarray(longitudes2)[np.newaxis, :])
+
+
+def nearest_points(latitudes, longitudes, query_latitudes, query_longitudes, k=1):
+    """
+    Finds nearest points using k-d tree of points on the unit sphere
+
+    :param latitudes, longitudes: arrays of coordinates of points to search in
+    :param query_latitudes, query_longitudes: arrays of coordinates of points to find neighbours of
+    :param k: number of neighbours
+    :return: Haversine distances in radians and indices of the nearest points, of shape (Q,) or (Q, k) if k > 1
+    """
+    tree = scipy.spatial.cKDTree(cartesian_coordinates(latitudes, longitudes))
+    chords, indices = tree.query(cartesian_coordinates(query_latitudes, query_longitudes), k=k)
+    return 2 * np.arcsin(np.clip(chords / 2, 0, 1)), indices
+
+
+class PointsTable:
+    """
+    Points stored as columns: arrays of labels, latitudes, longitudes and regressions. Indexing returns Point objects.
+    """
+
+    def __init__(self, labels, latitudes, longitudes, regressions):
+        self.labels = np.asarray(labels, dtype=str)
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.regressions = np.asarray(regressions, dtype=float)
+
+    @classmethod
+    def from_points(cls, points):
+        return cls([p.label for p in points], [p.latitude for p in points], [p.longitude for p in points],
+                   [p.regression for p in points])
+
+    def to_points(self):
+        return [Point(latitude, longitude, regression, label) for label, latitude, longitude, regression
+                in zip(self.labels.tolist(), self.latitudes.tolist(), self.longitudes.tolist(),
+                       self.regressions.tolist())]
+
+    def __getitem__(self, i):
+        return Point(float(self.latitudes[i]), float(self.longitudes[i]), float(self.regressions[i]),
+                     str(self.labels[i]))
+
+    def __len__(self):
+        return len(self.latitudes)
+
+
+POINT_COLUMNS = {'City': str, 'Latitude': str, 'Longitude': str, 'Regression': float}
+
+
+def load_table_from_csv(filename, cache=False):
+    """
+    :param filename: .csv file with City, Latitude, Longitude and Regression columns
+    :param cache: keep parsed points in a .npz file next to the .csv one, and read them from it while the .csv file
+    is not modified
+    :return: PointsTable
+    """
+    cache_file = os.path.splitext(filename)[0] + '.points.npz'
+    source = os.stat(filename)
+    if cache and os.path.exists(cache_file):
+        with np.load(cache_file, allow_pickle=False) as cached:
+            if cached['source_mtime_ns'] == source.st_mtime_ns and cached['source_size'] == source.st_size:
+                return PointsTable(cached['labels'], cached['latitudes'], cached['longitudes'], cached['regressions'])
+
+    dataframe = pandas.read_csv(filename, usecols=list(POINT_COLUMNS), dtype=POINT_COLUMNS)
+    table = PointsTable(dataframe['City'].to_numpy(dtype=str),
+                        geo_coords_str_to_float(dataframe['Latitude'], 'N', 'S'),
+                        geo_coords_str_to_float(dataframe['Longitude'], 'E', 'W'),
+                        dataframe['Regression'].to_numpy(dtype=float))
+
+    if cache:
+        np.savez(cache_file, labels=table.labels, latitudes=table.latitudes, longitudes=table.longitudes,
+                 regressions=table.regressions, source_mtime_ns=source.st_mtime_ns, source_size=source.st_size)
+
+    return table
+
 
-    return [Point(row['Latitude'], row['Longitude'], row['Regression'], row['City']) for _, row in dataframe.iterrows()]
+def load_from_csv(filename, cache=False):
+    return load_table_from_csv(filename, cache).to_points()
 
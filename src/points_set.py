@@ -1,146 +1,705 @@
-class PointsSet:
-    def __init__(self, delaunay_diagram, initial_point, minimal_point_density, minimal_regression):
-        self._delaunay = delaunay_diagram
-        self._points = {initial_point}
+import bisect
+import heapq
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+from src.components import triangle_components
+
+
+class IndexedSet:
+    """
+    Set of points' indices kept in a list with a map of positions, so that adding, removing and picking a random
+    element take constant time. Order of elements depends only on the order of operations.
+    """
+
+    def __init__(self, items=()):
+        self._items = []
+        self._positions = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self._positions:
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+
+    def remove(self, item):
+        # the last element takes place of the removed one
+        position = self._positions.pop(item)
+        last = self._items.pop()
+        if position < len(self._items):
+            self._items[position] = last
+            self._positions[last] = position
+
+    def discard(self, item):
+        if item in self._positions:
+            self.remove(item)
+
+    def pick(self, rng):
+        """
+        :param rng: numpy.random.Generator
+        :return: uniformly chosen element
+        """
+        return self._items[int(rng.integers(len(self._items)))]
+
+    def sample(self, rng, k):
+        """
+        :param rng: numpy.random.Generator
+        :return: list of min(k, len(self)) distinct elements in random order
+        """
+        return [self._items[i] for i in rng.choice(len(self._items), size=min(k, len(self._items)),
+                                                   replace=False).tolist()]
 
-        self._triangles = set()
+    def __contains__(self, item):
+        return item in self._positions
 
-        self._points_to_add = set(p for p in delaunay_diagram.neighbours[initial_point]
-                                  if p.regression > minimal_regression)
+    def __len__(self):
+        return len(self._items)
 
-        self._points_to_remove = set()
+    def __iter__(self):
+        return iter(self._items)
+
+    def __repr__(self):
+        return 'IndexedSet({})'.format(self._items)
+
+
+class PointsSet:
+    """
+    Set of points of a Delaunay diagram, together with triangles they make. Points and triangles are identified by
+    their indices in the diagram's arrays, membership is kept in boolean masks.
+
+    A point can be removed when its neighbours in the set keep some triangles and the set's triangles left are
+    connected through common edges. Connectivity is kept without searching the triangles, by Alexander duality on
+    the sphere: the set's triangles make one more component than there are independent cycles in the rest of the
+    sphere, where triangles are connected through common corners. The rest is split into holes, components of points
+    outside the set, in which points at most two edges apart are together. Removing a point adds
+    its triangles to the rest, touching it in pieces of their corners and edges. Number of components changes by the
+    number of pieces less the number of distinct holes they touch and the number of components made only of the
+    point's triangles, all of which is found around the point. Holes are relabelled when they merge or split, by
+    walking only the smaller ones.
+    """
+
+    def __init__(self, delaunay_diagram, initial_point, minimal_point_density, minimal_regression, allowed=None):
+        """
+        :param allowed: (N,) boolean mask of points the set may contain besides having regression above minimal,
+        e.g. a tile of the diagram, all points by default
+        """
+        self._delaunay = delaunay_diagram
+        self._neighbours = delaunay_diagram.neighbours_list
+        self._triangles_by_points = delaunay_diagram.triangles_by_points_list
+        self._corners = delaunay_diagram.simplices_list
+        self._adjacent = delaunay_diagram.triangle_adjacency_list
+        self._triangle_areas = delaunay_diagram.areas_list
+        self._regressions = delaunay_diagram.regressions_list
+        if allowed is not None:
+            # points outside are never eligible
+            self._regressions = np.where(allowed, delaunay_diagram.regressions, -np.inf).tolist()
+
+        # arrays for evaluating many candidates at once
+        self._simplices = delaunay_diagram.simplices
+        self._triangle_areas_array = delaunay_diagram.areas
+        self._point_triangle_indptr = delaunay_diagram.point_triangle_indptr
+        self._point_triangle_indices = delaunay_diagram.point_triangle_indices
+
+        points_n = delaunay_diagram.points_n
+        self._points = np.zeros(points_n, dtype=bool)
+        self._points[initial_point] = True
+        self._points_n = 1
+
+        self._triangles = np.zeros(len(delaunay_diagram.simplices), dtype=bool)
+
+        self._points_to_add = IndexedSet(p for p in self._neighbours[initial_point]
+                                         if self._regressions[p] > minimal_regression)
+
+        self._points_to_remove = IndexedSet()
 
         self._minimal_regression = minimal_regression
         self._minimal_point_density = minimal_point_density
         self._area = 0
         self._value = 0
 
-    def _can_remove(self, point):
-        if len(self._points) == 1:
-            return False
-        if len(self._points) <= 3:
-            return True
+        # areas of the set's triangles in ascending order, used for evaluating the density-capped value
+        self._areas = []
+
+        # hole of every point outside the set and number of points in every hole, all points but one make one hole
+        self._holes = [0] * points_n
+        self._holes[initial_point] = -1
+        self._hole_sizes = {0: points_n - 1}
+        self._next_hole = 1
+        # components of the set's triangles
+        self._components_n = 0
+
+        # for points of the set, as found by _removability: whether their neighbours keep triangles without them,
+        # number of their triangles and change of the number of components when they are removed
+        self._keeps_neighbours = np.zeros(points_n, dtype=bool)
+        self._star_triangles_n = np.zeros(points_n, dtype=np.int64)
+        self._removal_changes = np.zeros(points_n, dtype=np.int64)
+        # with at most that many triangles the set may lose all of them with one point
+        self._max_star = int(np.diff(self._point_triangle_indptr).max())
+
+    @classmethod
+    def from_state(cls, delaunay_diagram, state):
+        """
+        :param state: dictionary made by state(), e.g. loaded from a checkpoint
+        :return: PointsSet equal to the one the state was taken from
+        """
+        points = np.asarray(state['points'], dtype=np.int64)
+        points_set = cls(delaunay_diagram, int(points[0]), float(state['minimal_point_density']),
+                         float(state['minimal_regression']))
+
+        points_set._points[:] = False
+        points_set._points[points] = True
+        points_set._points_n = len(points)
+        # the set's triangles are exactly those with all corners in the set
+        points_set._triangles = points_set._points[points_set._simplices].all(axis=1)
+        points_set._areas = sorted(points_set._triangle_areas_array[points_set._triangles].tolist())
+        points_set._area = float(state['area'])
+        points_set._index_removability()
+
+        # order of candidates decides which one is picked, so it is restored as well
+        points_set._points_to_add = IndexedSet(np.asarray(state['points_to_add']).tolist())
+        points_set._points_to_remove = IndexedSet(np.asarray(state['points_to_remove']).tolist())
+
+        points_set._value = points_set._get_value(points_set._points_n, points_set._area)
+        return points_set
+
+    @classmethod
+    def from_points(cls, delaunay_diagram, points, minimal_point_density, minimal_regression, allowed=None):
+        """
+        :param points: indices of points, whose triangles are connected through common edges, e.g. a warm start, see
+        connected_region
+        :return: PointsSet of the points, equal to one they were added to one by one
+        """
+        points = np.asarray(points, dtype=np.int64)
+        points_set = cls(delaunay_diagram, int(points[0]), minimal_point_density, minimal_regression, allowed)
+        if len(points) == 1:
+            return points_set
+
+        points_set._points[points] = True
+        points_set._points_n = len(points)
+        in_set = points_set._points[points_set._simplices]
+        points_set._triangles = in_set.all(axis=1)
+        points_set._areas = sorted(points_set._triangle_areas_array[points_set._triangles].tolist())
+        points_set._area = sum(points_set._areas)
+
+        # points making a triangle with two of the set's points
+        two = in_set.sum(axis=1) == 2
+        third = points_set._simplices[two][~in_set[two]]
+        points_set._points_to_add = IndexedSet(p for p in np.unique(third).tolist()
+                                               if points_set._regressions[p] > minimal_regression)
+
+        points_set._index_removability()
+        if points_set._components_n != 1:
+            raise ValueError("Triangles of the points make {} components connected through common edges, not one"
+                             .format(points_set._components_n))
+        points_set._rebuild_points_to_remove()
+        points_set._value = points_set._get_value(points_set._points_n, points_set._area)
+        return points_set
+
+    def state(self):
+        """
+        :return: dictionary of arrays describing the set, for from_state
+        """
+        return dict(points=self.points,
+                    points_to_add=np.array(list(self._points_to_add), dtype=np.int64),
+                    points_to_remove=np.array(list(self._points_to_remove), dtype=np.int64),
+                    area=self._area,
+                    minimal_point_density=self._minimal_point_density,
+                    minimal_regression=self._minimal_regression)
+
+    def _index_removability(self):
+        """
+        Labels holes, counts components of the set's triangles and finds removability of every point of the set, for
+        a set made at once
+        """
+        outside = ~self._points
+        # points and triangles outside the set make a graph, in which triangles are connected through their corners
+        complement = np.flatnonzero(~self._triangles)
+        points_n = len(self._points)
+        corners = self._simplices[complement].ravel()
+        nodes = points_n + np.repeat(np.arange(len(complement)), 3)
+        graph = scipy.sparse.coo_matrix((np.ones(len(corners)), (corners, nodes)),
+                                        shape=(points_n + len(complement),) * 2)
+        _, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+
+        holes = np.full(points_n, -1, dtype=np.int64)
+        _, holes[outside] = np.unique(labels[:points_n][outside], return_inverse=True)
+        self._holes = holes.tolist()
+        self._hole_sizes = dict(enumerate(np.bincount(holes[outside]).tolist()))
+        self._next_hole = len(self._hole_sizes)
+
+        self._components_n = triangle_components(self._delaunay, self._triangles)[1]
+        for p in np.flatnonzero(self._points).tolist():
+            self._removability(p)
+
+    def _near_outside(self, point):
+        """
+        :return: points outside the set at most two edges from the point, that is in one hole with it
+        """
+        near = set()
+        for p in self._neighbours[point]:
+            near.add(p)
+            near.update(self._neighbours[p])
+        near.discard(point)
+        return [p for p in near if not self._points[p]]
+
+    def _relabel_hole(self, start, label):
+        """
+        Gives the label to the hole of the start point
+        :return: list of relabelled points
+        """
+        old = self._holes[start]
+        self._holes[start] = label
+        relabelled = [start]
+        reached = [start]
+        while len(reached) > 0:
+            for p in self._near_outside(reached.pop()):
+                if self._holes[p] == old:
+                    self._holes[p] = label
+                    relabelled.append(p)
+                    reached.append(p)
+        return relabelled
+
+    def _join_holes(self, point):
+        """
+        Puts the point, which left the set, into a hole with the points outside the set around it, holes it connects
+        are merged into the largest one
 
-        # check if there are no points left that are not a part of triangle
-        for p in self._delaunay.neighbours[point].intersection(self._points):
-            can_be_left = False
-            for t in self._delaunay.triangles_by_points[p].intersection(self._triangles):
-                if point not in t.points:
-                    can_be_left = True
-                    break
+        :return: list of relabelled points
+        """
+        near = self._near_outside(point)
+        holes = sorted({self._holes[p] for p in near})
+        if len(holes) == 0:
+            self._holes[point] = self._next_hole
+            self._hole_sizes[self._next_hole] = 1
+            self._next_hole += 1
+            return []
+
+        largest = max(holes, key=lambda hole: (self._hole_sizes[hole], -hole))
+        relabelled = []
+        for hole in holes:
+            if hole != largest:
+                self._hole_sizes[largest] += self._hole_sizes.pop(hole)
+                relabelled.extend(self._relabel_hole(next(p for p in near if self._holes[p] == hole), largest))
+        self._holes[point] = largest
+        self._hole_sizes[largest] += 1
+        return relabelled
+
+    def _leave_hole(self, point):
+        """
+        Takes the point, which joined the set, out of its hole, which may split. Pieces are searched from points
+        around it at once, searches that meet are joined, and every search that ends first gives a piece with a new
+        label, so the time is bound by the smaller pieces.
 
-            if not can_be_left:
-                return False
+        :return: list of relabelled points
+        """
+        hole = self._holes[point]
+        self._holes[point] = -1
+        self._hole_sizes[hole] -= 1
+        if self._hole_sizes[hole] == 0:
+            del self._hole_sizes[hole]
+            return []
+
+        near = self._near_outside(point)
+        searches = {i: ([p], [p]) for i, p in enumerate(near)}
+        owners = {p: i for i, p in enumerate(near)}
+        joined = list(range(len(near)))
+
+        def find(i):
+            while joined[i] != i:
+                joined[i] = joined[joined[i]]
+                i = joined[i]
+            return i
+
+        relabelled = []
+        while len(searches) > 1:
+            for i in list(searches):
+                if i not in searches:
+                    continue
+                reached, members = searches[i]
+                if len(reached) == 0:
+                    del searches[i]
+                    self._hole_sizes[hole] -= len(members)
+                    self._hole_sizes[self._next_hole] = len(members)
+                    for p in members:
+                        self._holes[p] = self._next_hole
+                    self._next_hole += 1
+                    relabelled.extend(members)
+                    if len(searches) == 1:
+                        break
+                    continue
+
+                for p in self._near_outside(reached.pop()):
+                    j = owners.get(p)
+                    if j is None:
+                        owners[p] = i
+                        reached.append(p)
+                        members.append(p)
+                        continue
+                    j = find(j)
+                    if j != i:
+                        # the smaller search is joined to the larger one
+                        if len(searches[j][1]) > len(members):
+                            i, j = j, i
+                        joined[j] = i
+                        other_reached, other_members = searches.pop(j)
+                        searches[i][0].extend(other_reached)
+                        searches[i][1].extend(other_members)
+                        reached, members = searches[i]
+        return relabelled
+
+    def _removability(self, point):
+        """
+        Finds, for a point of the set, whether its neighbours in the set keep triangles without it, number of its
+        triangles and change of the number of components of the set's triangles when it is removed, as described in
+        the class
 
-        # check left triangles consistency
-        triangles_to_reach = {t for t in self._triangles if point not in t.points}
+        :return: None
+        """
+        star = [t for t in self._triangles_by_points[point] if self._triangles[t]]
+
+        keeps_neighbours = True
+        for p in self._neighbours[point]:
+            if self._points[p] and not any(self._triangles[t] and point not in self._corners[t]
+                                           for t in self._triangles_by_points[p]):
+                keeps_neighbours = False
+                break
+
+        # corners of the point's triangles touching the rest of the sphere, joined by edges touching it, make pieces
+        pieces = {}
+
+        def find(p):
+            while pieces[p] != p:
+                pieces[p] = pieces[pieces[p]]
+                p = pieces[p]
+            return p
+
+        holes = set()
+        in_star = set(star)
+        wedges = {t: t for t in star}
+        for t in star:
+            corners = self._corners[t]
+            for p in corners:
+                if p not in pieces:
+                    for n in self._neighbours[p]:
+                        if not self._points[n]:
+                            pieces[p] = p
+                            holes.add(self._holes[n])
+                            break
+            for i, a in enumerate(self._adjacent[t]):
+                if not self._triangles[a]:
+                    pieces[find(corners[i])] = find(corners[(i + 1) % 3])
+                elif a in in_star:
+                    # triangles of the point connected through common edges make wedges around it
+                    root, other = t, a
+                    while wedges[root] != root:
+                        root = wedges[root]
+                    while wedges[other] != other:
+                        other = wedges[other]
+                    wedges[root] = other
+
+        # wedges not connected with any other triangle of the set are components of their own
+        isolated = {t for t in star if wedges[t] == t}
+        for t in star:
+            if any(self._triangles[a] and a not in in_star for a in self._adjacent[t]):
+                root = t
+                while wedges[root] != root:
+                    root = wedges[root]
+                isolated.discard(root)
+
+        self._keeps_neighbours[point] = keeps_neighbours
+        self._star_triangles_n[point] = len(star)
+        self._removal_changes[point] = sum(find(p) == p for p in pieces) - len(holes) - len(isolated)
 
-        reached = [triangles_to_reach.pop()] if len(triangles_to_reach) > 0 else []
+    def _can_remove(self, point):
+        """
+        :return: whether the point can be removed, from removability last found for it by _removability
+        """
+        if self._points_n == 1:
+            return False
+        if self._points_n <= 3:
+            return True
+        if not self._keeps_neighbours[point]:
+            return False
+        # the set is left either without triangles or with connected ones
+        return (self._star_triangles_n[point] == len(self._areas)
+                or self._components_n + self._removal_changes[point] == 1)
 
-        while len(reached) > 0:
-            triangle = reached.pop()
+    def _rebuild_points_to_remove(self):
+        """
+        Finds removable points of the whole set, from removability found for each one
+        """
+        if self._points_n == 1:
+            removable = np.zeros(len(self._points), dtype=bool)
+        elif self._points_n <= 3:
+            removable = self._points
+        else:
+            removable = self._points & self._keeps_neighbours & (
+                (self._star_triangles_n == len(self._areas)) | (self._removal_changes == 1 - self._components_n))
+        self._points_to_remove = IndexedSet(np.flatnonzero(removable).tolist())
 
-            new_reached = triangle.adjacent.intersection(triangles_to_reach)
-            reached.extend(new_reached)
-            triangles_to_reach -= new_reached
+    def _rebuilds(self, components_n, triangles_n):
+        """
+        :param components_n, triangles_n: numbers of components and triangles before the move
+        :return: whether removability of every point has to be checked again after the move
+        """
+        return (self._points_n <= 4 or components_n != self._components_n
+                or min(triangles_n, len(self._areas)) <= self._max_star)
+
+    def _update_points_to_remove(self, point, relabelled, rebuild):
+        """
+        Refreshes points_to_remove after the point was added or removed. Removability found for points of the set
+        changes only within two edges from the point and from points of relabelled holes.
 
-        return len(triangles_to_reach) == 0
+        :param point: index of the point that was added or removed
+        :param relabelled: points outside the set whose hole was relabelled
+        :param rebuild: whether removability changed for the whole set, because the number of components changed or
+        the set has so few triangles, that a point may take all of them
+        :return: None
+        """
+        to_check = set()
+        for p in [point] + relabelled:
+            for n in self._neighbours[p]:
+                to_check.add(n)
+                to_check.update(self._neighbours[n])
+        to_check.add(point)
+        to_check = [p for p in to_check if self._points[p]]
+
+        for p in to_check:
+            self._removability(p)
+
+        if rebuild:
+            self._rebuild_points_to_remove()
+            return
+
+        self._points_to_remove.discard(point)
+        for p in to_check:
+            if self._can_remove(p):
+                self._points_to_remove.add(p)
+            else:
+                self._points_to_remove.discard(p)
 
     def add_point(self, point):
         """
 
-        :param point: Point to add, must be in points_to_add
+        :param point: index of a point to add, must be in points_to_add
         :return: None
         """
 
-        self._points.add(point)
+        self._points[point] = True
+        self._points_n += 1
 
-        if len(self._points) == 2:
-            self._points_to_add = set()
+        if self._points_n == 2:
+            self._points_to_add = IndexedSet()
         else:
             self._points_to_add.remove(point)
 
-        new_triangles = set()
-        for p in self._delaunay.neighbours[point].intersection(self._points):
-            for m in self._delaunay.neighbours_making_triangles[(point, p)]:
-                if m not in self._points:
-                    if m.regression > self._minimal_regression:
-                        self._points_to_add.add(m)
-                else:
-                    triangle = self._delaunay.triangles[(point, p, m)]
-                    new_triangles.add(triangle)
-
-        self._area += sum(t.area for t in new_triangles)
-        self._triangles.update(new_triangles)
-
-        self._points_to_remove = {p for p in self._points if self._can_remove(p)}
-        self._value = self._get_value(len(self._points), self._triangles)
+        new_triangles = []
+        for t in self._triangles_by_points[point]:
+            a, b = (p for p in self._corners[t] if p != point)
+            if self._points[a] and self._points[b]:
+                new_triangles.append(t)
+            elif self._points[a]:
+                if self._regressions[b] > self._minimal_regression:
+                    self._points_to_add.add(b)
+            elif self._points[b]:
+                if self._regressions[a] > self._minimal_regression:
+                    self._points_to_add.add(a)
+
+        triangles_n = len(self._areas)
+        for t in new_triangles:
+            self._triangles[t] = True
+            self._area += self._triangle_areas[t]
+            bisect.insort(self._areas, self._triangle_areas[t])
+
+        # the point's triangles leave the rest of the sphere, which removing it would undo
+        relabelled = self._leave_hole(point)
+        self._removability(point)
+        components_n = self._components_n
+        self._components_n -= self._removal_changes[point]
+        self._update_points_to_remove(point, relabelled, self._rebuilds(components_n, triangles_n))
+        self._value = self._get_value(self._points_n, self._area)
 
     def remove_point(self, point):
         """
 
-        :param point: Point to remove, must be in points_to_remove
+        :param point: index of a point to remove, must be in points_to_remove
         :return: None
         """
 
-        self._points.remove(point)
+        self._removability(point)
+        components_n = self._components_n
+        self._components_n += self._removal_changes[point]
+        triangles_n = len(self._areas)
+
+        self._points[point] = False
+        self._points_n -= 1
 
-        removed_triangles = self._delaunay.triangles_by_points[point].intersection(self._triangles)
-        self._triangles -= removed_triangles
-        self._area -= sum(t.area for t in removed_triangles)
+        for t in self._triangles_by_points[point]:
+            if self._triangles[t]:
+                self._triangles[t] = False
+                self._area -= self._triangle_areas[t]
+                del self._areas[bisect.bisect_left(self._areas, self._triangle_areas[t])]
+        if len(self._areas) == 0:
+            self._area = 0
 
-        if len(self._points) == 1:
-            self._points_to_add = set(p for p in self._delaunay.neighbours[self._points.__iter__().__next__()]
-                                      if p.regression > self._minimal_regression)
+        if self._points_n == 1:
+            self._points_to_add = IndexedSet(p for p in self._neighbours[int(np.flatnonzero(self._points)[0])]
+                                             if self._regressions[p] > self._minimal_regression)
 
         else:
-            for p in self._delaunay.neighbours[point].intersection(self._points_to_add):
-                for n in self._delaunay.neighbours[p].intersection(self._points):
-                    if len(self._delaunay.neighbours_making_triangles[(p, n)].intersection(self._points)) > 0:
+            for p in self._neighbours[point]:
+                if p not in self._points_to_add:
+                    continue
+                for n in self._neighbours[p]:
+                    if self._points[n] and self._makes_triangle_with_set(p, n):
                         self._points_to_add.remove(p)
                         break
 
             self._points_to_add.add(point)
 
-        self._points_to_remove = {p for p in self._points if self._can_remove(p)}
-        self._value = self._get_value(len(self._points), self._triangles)
+        if len(self._areas) == 0:
+            self._components_n = 0
+        relabelled = self._join_holes(point)
+        self._update_points_to_remove(point, relabelled, self._rebuilds(components_n, triangles_n))
+        self._value = self._get_value(self._points_n, self._area)
+
+    def _makes_triangle_with_set(self, a, b):
+        """
+        :return: whether a third point of any triangle on edge a-b is in the set
+        """
+        for t in self._triangles_by_points[a]:
+            corners = self._corners[t]
+            if b in corners and any(self._points[p] for p in corners if p != a and p != b):
+                return True
+        return False
 
-    def _get_value(self, points_n, triangles):
-        if len(triangles) == 0:
+    def _get_value(self, points_n, area, added=(), removed=()):
+        """
+        Value of the set's triangles, optionally with some triangles added or left out. The area is limited by the
+        number of points and minimal density, in that case triangles are taken from the smallest ones.
+
+        :param points_n: number of points
+        :param area: total area of the triangles
+        :param added: areas of triangles to add, in ascending order
+        :param removed: areas of the set's triangles to leave out, in ascending order
+        :return: value
+        """
+        if len(self._areas) + len(added) - len(removed) == 0:
             return 0
 
-        area = sum(t.area for t in triangles)
         max_area = points_n / self._minimal_point_density
 
         if area <= max_area:
             return area
 
-        area = 0
-        for t in sorted(triangles, key=lambda t: t.area):
-            if area + t.area <= max_area:
-                area += t.area
+        # the smallest triangles fit in the limit, so only the largest ones have to be visited one by one
+        removed = list(removed)
+        largest = []
+        for a in heapq.merge(reversed(self._areas), reversed(added), reverse=True):
+            if len(removed) > 0 and a == removed[-1]:
+                removed.pop()
+                continue
+            largest.append(a)
+            area -= a
+            if area <= max_area:
+                break
+        else:
+            area = 0
+
+        for a in reversed(largest):
+            if area + a <= max_area:
+                area += a
             else:
-                area -= t.area
+                area -= a
 
         return area
 
+    def _triangles_with_added(self, point):
+        return [t for t in self._triangles_by_points[point]
+                if all(self._points[p] for p in self._corners[t] if p != point)]
+
     def value_with_added(self, point):
-        triangles = self._triangles.union(
-            t for t in self._delaunay.triangles_by_points[point] if t.points.issubset(self._points))
+        added = sorted(self._triangle_areas[t] for t in self._triangles_with_added(point))
 
-        return self._get_value(len(self._points) + 1, triangles)
+        return self._get_value(self._points_n + 1, self._area + sum(added), added=added)
 
     def value_with_removed(self, point):
-        triangles = self._triangles - self._delaunay.triangles_by_points[point]
+        removed = sorted(self._triangle_areas[t] for t in self._triangles_by_points[point] if self._triangles[t])
+
+        return self._get_value(self._points_n - 1, self._area - sum(removed), removed=removed)
+
+    def _candidates_triangles(self, points):
+        """
+        :param points: array of points' indices
+        :return: for every triangle of the points, position of its point in the array and the triangle's index
+        """
+        starts = self._point_triangle_indptr[points]
+        counts = self._point_triangle_indptr[points + 1] - starts
+        owners = np.repeat(np.arange(len(points)), counts)
+        offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owners, self._point_triangle_indices[starts[owners] + offsets]
+
+    def _values_with_changed(self, points, owners, triangles, sign, exact_value):
+        """
+        :param owners, triangles: triangles added (sign 1) or removed (sign -1) together with each of the points
+        :param exact_value: value_with_added or value_with_removed, used when the density limits the area
+        :return: array of values
+        """
+        triangles_n = len(self._areas) + sign * np.bincount(owners, minlength=len(points))
+        areas = self._area + sign * np.bincount(owners, weights=self._triangle_areas_array[triangles],
+                                                minlength=len(points))
+        max_area = (self._points_n + sign) / self._minimal_point_density
+
+        values = np.where(triangles_n > 0, areas, 0.0)
+        # only the values limited by density need sorting the areas
+        for i in np.flatnonzero((areas > max_area) & (triangles_n > 0)).tolist():
+            values[i] = exact_value(int(points[i]))
+        return values
+
+    def values_with_added(self, points):
+        """
+        Vectorized value_with_added
+
+        :param points: indices of points from points_to_add
+        :return: array of values
+        """
+        points = np.asarray(points, dtype=np.int64)
+        owners, triangles = self._candidates_triangles(points)
+        # the candidate is not in the set, so the triangle is new if both other corners are
+        new = self._points[self._simplices[triangles]].sum(axis=1) == 2
+        return self._values_with_changed(points, owners[new], triangles[new], 1, self.value_with_added)
+
+    def values_with_removed(self, points):
+        """
+        Vectorized value_with_removed
+
+        :param points: indices of points from points_to_remove
+        :return: array of values
+        """
+        points = np.asarray(points, dtype=np.int64)
+        owners, triangles = self._candidates_triangles(points)
+        removed = self._triangles[triangles]
+        return self._values_with_changed(points, owners[removed], triangles[removed], -1, self.value_with_removed)
 
-        return self._get_value(len(self._points) - 1, triangles)
+    @property
+    def delaunay_diagram(self):
+        return self._delaunay
 
     @property
     def points_to_add(self):
+        """
+        :return: IndexedSet of points that can be added
+        """
         return self._points_to_add
 
     @property
     def points_to_remove(self):
+        """
+        :return: IndexedSet of points that can be removed
+        """
         return self._points_to_remove
 
     @property
@@ -149,12 +708,35 @@ class PointsSet:
 
     @property
     def points(self):
+        """
+        :return: array of indices of the set's points
+        """
+        return np.flatnonzero(self._points)
+
+    @property
+    def points_mask(self):
         return self._points
 
+    @property
+    def points_n(self):
+        return self._points_n
+
+    @property
+    def triangles_mask(self):
+        return self._triangles
+
     @property
     def has_minimal_density(self):
-        return len(self._points) >= self._minimal_point_density * self._area
+        return self._points_n >= self._minimal_point_density * self._area
 
     @property
     def area(self):
         return self._area
+
+    @property
+    def minimal_point_density(self):
+        return self._minimal_point_density
+
+    @property
+    def minimal_regression(self):
+        return self._minimal_regression
@@ -1,53 +1,444 @@
-from src.point import Point
-from src.delaunay_diagram import DelaunayDiagram
+from src.point import load_table_from_csv
+from src.delaunay_diagram import DelaunayDiagram, diagram_cache_file
 from src.points_set import PointsSet
 from src.simulated_annealing import SimulatedAnnealing
+from src.parallel_tempering import ParallelTempering, temperature_ladder
+from src.multiresolution import MultiResolution
+from src.threshold_sweep import ThresholdSweep
+from src.partitioned_annealing import PartitionedAnnealing
+from src.components import EligibleComponents
+from src.cooling import SCHEDULES, cooling_schedule
+from src.instrumentation import Statistics
 
+import numpy as np
 import pandas as pd
 import argparse
+import cProfile
 
-import random
+import itertools
+import multiprocessing
+import os
 
 
-parser = argparse.ArgumentParser(description='Process parameters of simulated annealing')
+parser = argparse.ArgumentParser(description='Process parameters of simulated annealing. Comma separated lists of '
+                                             'seeds, temperatures, densities or regressions run every combination '
+                                             'of them in parallel')
 parser.add_argument('--data')
 parser.add_argument('--max_iterations')
 parser.add_argument('--temperature')
 parser.add_argument('--seed')
 parser.add_argument('--minimal_density')
 parser.add_argument('--minimal_regression')
+parser.add_argument('--cache', action='store_true', help='cache parsed points and diagram next to the data file')
+parser.add_argument('--processes', default=None, help='number of parallel runs, all cores by default')
+parser.add_argument('--results', default='../out/results.csv', help='best region of every run, e.g. for '
+                                                                   'visualise --region')
+parser.add_argument('--history_interval', default=1, help='record history every that many iterations')
+parser.add_argument('--log_interval', default=None, help='print state every that many iterations, 0 to turn off, 1 by '
+                                                         'default, 0 in parallel runs and tiles of partitioned '
+                                                         'annealing')
+parser.add_argument('--batch_size', default=1, help='number of candidates evaluated at once in every iteration')
+parser.add_argument('--batch_selection', default='metropolis', choices=SimulatedAnnealing.BATCH_SELECTIONS,
+                    help='metropolis: first candidate of a batch accepted by Metropolis criterion, best: the best '
+                         'candidate, accepted by Metropolis criterion')
+parser.add_argument('--solver', default='annealing', choices=['annealing', 'tempering', 'multiresolution', 'sweep',
+                                                                'partitioned'],
+                    help='tempering runs --replicas chains at temperatures from --temperature to --max_temperature '
+                         'in parallel, swapping them between neighbouring temperatures; multiresolution anneals '
+                         'clusters of points in cells of --cell_size degrees first and refines the best of them; '
+                         'sweep finds the largest connected region of eligible points for every minimal regression '
+                         'without annealing and writes them into --results; partitioned runs a chain in every one '
+                         'of --tiles parts of the diagram in --processes processes and merges regions that touch')
+parser.add_argument('--start', default='random', choices=['random', 'sweep'],
+                    help='random: annealing starts from a random point of a promising component, sweep: from the '
+                         'largest connected region of eligible points')
+parser.add_argument('--replicas', default=4, help='number of chains of tempering')
+parser.add_argument('--max_temperature', default=None, help='temperature of the hottest chain, 100 times '
+                                                            '--temperature by default')
+parser.add_argument('--swap_interval', default=100, help='iterations between swaps of tempering chains')
+parser.add_argument('--cell_size', default=5.0, help='size of cells clustering points for multiresolution, in degrees')
+parser.add_argument('--refine_iterations', default=None,
+                    help='iterations of multiresolution on all points, or of refining merged regions of partitioned '
+                         'annealing, a tenth of --max_iterations by default, which clusters or parts get')
+parser.add_argument('--tiles', default=8, help='number of parts of the diagram for partitioned annealing')
+parser.add_argument('--halo', default=3, help='rings of neighbours a chain of partitioned annealing can reach beyond '
+                                              'its part')
+parser.add_argument('--refine_temperature', default=None, help='starting temperature of multiresolution on all '
+                                                              'points, a tenth of --temperature by default')
+parser.add_argument('--cooling', default='geometric', choices=SCHEDULES, help='cooling schedule')
+parser.add_argument('--cooling_rate', default=0.95, help='temperature is multiplied by that every epoch')
+parser.add_argument('--epoch', default=None, help='iterations with the same temperature, for adaptive schedule '
+                                                  'iterations between adjustments, by default 1000 for adaptive '
+                                                  'schedule and 1 for the others')
+parser.add_argument('--reheat_after', default=1000, help='iterations without improvement before reheating')
+parser.add_argument('--patience', default=0, help='stop after that many iterations without improvement, 0 turns '
+                                                  'it off')
+parser.add_argument('--promising_fraction', default=0.1,
+                    help='start only in components of eligible points whose highest possible value is at least that '
+                         'part of the highest one')
+parser.add_argument('--statistics', action='store_true', help='count moves and measure time spent in the algorithm')
+parser.add_argument('--profile', default=None, help='dump cProfile statistics of the run into that file, parallel '
+                                                    'runs add number of configuration to its name')
+parser.add_argument('--checkpoint', default=None, help='file the state of the run is saved into, its history is '
+                                                       'appended to the file with .history added to its name, '
+                                                       'parallel runs add number of configuration to its name, only '
+                                                       'for the annealing solver')
+parser.add_argument('--checkpoint_interval', default=10000, help='save the state every that many iterations')
+parser.add_argument('--resume', action='store_true', help='continue the run saved in --checkpoint, if it exists')
 args = parser.parse_args()
 
 
+SWEPT_PARAMETERS = ['seed', 'temperature', 'minimal_density', 'minimal_regression']
+
+# diagram and components of eligible points for every minimal regression, shared with worker processes, which are
+# forked after they are built
+_delaunay_diagram = None
+_components = {}
+# largest regions for every minimal regression, built when first needed
+_sweep = None
+
+
 def main():
-    points_df = pd.read_csv(args.data)
-    points = [Point(p[1]['Latitude'], p[1]['Longitude'], p[1]['Regression'], p[1]['City'])
-              for p in points_df.iterrows()]
-
-    delaunay_diagram = DelaunayDiagram(points=points)
-    starting_point = initiate(points, args.seed, args.minimal_regression)
-    points_set = PointsSet(delaunay_diagram=delaunay_diagram, initial_point=starting_point,
-                           minimal_point_density=float(args.minimal_density),
-                           minimal_regression=float(args.minimal_regression))
-    simulated_annealing = SimulatedAnnealing(points_set=points_set, temperature=float(args.temperature),
-                                             max_iterations=int(args.max_iterations), seed=int(args.seed))
-    result, best = simulated_annealing.calculate()
+    global _delaunay_diagram
+
+    points = load_table_from_csv(args.data, cache=args.cache)
+
+    _delaunay_diagram = DelaunayDiagram(points=points,
+                                        cache_file=diagram_cache_file(args.data) if args.cache else None)
+
+    configurations = [dict(zip(SWEPT_PARAMETERS, values)) for values in itertools.product(
+        *(str(getattr(args, parameter)).split(',') for parameter in SWEPT_PARAMETERS))]
+    for minimal_regression in set(configuration['minimal_regression'] for configuration in configurations):
+        if len(_eligible_components(minimal_regression)) == 0:
+            parser.error('no point has regression above {}'.format(minimal_regression))
+
+    if args.solver != 'annealing' and (args.checkpoint is not None or args.resume):
+        parser.error('--checkpoint and --resume work only with the annealing solver')
+
+    if args.solver == 'sweep' or args.start == 'sweep':
+        # built before runs are forked, so they share it
+        _threshold_sweep()
+
+    if args.solver == 'tempering':
+        if len(configurations) > 1:
+            parser.error('tempering runs a single configuration')
+        run_tempering(**configurations[0])
+        return
+    if args.solver == 'sweep':
+        run_sweep(configurations)
+        return
+    if args.solver == 'partitioned':
+        if len(configurations) > 1:
+            parser.error('partitioned annealing runs a single configuration')
+        run_partitioned(**configurations[0])
+        return
+    if args.solver == 'multiresolution':
+        if len(configurations) > 1:
+            parser.error('multiresolution runs a single configuration')
+        run_multiresolution(**configurations[0])
+        return
+
+    if len(configurations) > 1:
+        run_configurations(configurations)
+        return
+
+    simulated_annealing, result, best, statistics = run(**configurations[0], profile_file=args.profile,
+                                                        checkpoint_file=args.checkpoint)
     simulated_annealing.save_history()
 
+    if statistics is not None:
+        print()
+        print(statistics)
+
     print()
-    print("Final result ({}) points:".format(len(result.points)))
-    print(*result.points, sep=",\n")
+    print("Final result ({}) points:".format(result.points_n))
+    print(*(points[i] for i in result.points), sep=",\n")
     print()
     print("Best result ({}) points:".format(len(best)))
-    print(*best, sep=",\n")
+    print(*(points[i] for i in best), sep=",\n")
+    _save_results([_result(configurations[0], simulated_annealing.max_value, best, final_value=result.value,
+                           statistics=statistics.to_dict() if statistics is not None else None)])
+
+
+def _eligible_components(minimal_regression):
+    """
+    :return: EligibleComponents for the minimal regression, built and summarized when first needed
+    """
+    minimal_regression = float(minimal_regression)
+    if minimal_regression not in _components:
+        components = _components[minimal_regression] = EligibleComponents(_delaunay_diagram, minimal_regression)
+        if len(components) > 0:
+            print("Minimal regression {}: {} components of eligible points, the largest has {} points".format(
+                minimal_regression, len(components), components.sizes.max()))
+    return _components[minimal_regression]
+
+
+def run(seed, temperature, minimal_density, minimal_regression, profile_file=None, checkpoint_file=None,
+        parallel=False):
+    """
+    Runs simulated annealing on the shared diagram, parameters are given as in command line
+
+    :param profile_file: file to dump cProfile statistics of the run into, None turns profiling off
+    :param checkpoint_file: file to save the state of the run into, with --resume the run saved there is continued
+    :param parallel: the run is one of a pool, it prints its state only if --log_interval is given
+    :return: SimulatedAnnealing, final PointsSet, indices of the best points and Statistics (None without
+    --statistics)
+    """
+    parameters = dict(max_iterations=int(args.max_iterations), history_interval=int(args.history_interval),
+                      log_interval=_log_interval(parallel), batch_size=int(args.batch_size),
+                      batch_selection=args.batch_selection, checkpoint_file=checkpoint_file,
+                      checkpoint_interval=int(args.checkpoint_interval), patience=int(args.patience),
+                      cooling=_cooling_schedule(float(temperature)))
+
+    if args.resume and checkpoint_file is not None and os.path.exists(checkpoint_file):
+        # seed, temperature and minimal values are taken from the checkpoint
+        simulated_annealing = SimulatedAnnealing.from_checkpoint(checkpoint_file, _delaunay_diagram, **parameters)
+        print("Resumed {} at iteration {}".format(checkpoint_file, simulated_annealing.iterations))
+        restored = simulated_annealing.points_set
+        if (restored.minimal_point_density, restored.minimal_regression) != (float(minimal_density),
+                                                                              float(minimal_regression)):
+            print("Checkpoint was saved with minimal density {} and minimal regression {}, they are used instead "
+                  "of the command line ones".format(restored.minimal_point_density, restored.minimal_regression))
+        minimal_density, minimal_regression = restored.minimal_point_density, restored.minimal_regression
+    else:
+        if args.start == 'sweep':
+            points_set = _threshold_sweep().points_set(float(minimal_regression), float(minimal_density))
+            if points_set is None:
+                raise ValueError("Points with regression above {} make no triangle".format(minimal_regression))
+        else:
+            starting_point = initiate(_eligible_components(minimal_regression), seed, minimal_density)
+            points_set = PointsSet(delaunay_diagram=_delaunay_diagram, initial_point=starting_point,
+                                   minimal_point_density=float(minimal_density),
+                                   minimal_regression=float(minimal_regression))
+        simulated_annealing = SimulatedAnnealing(points_set=points_set, temperature=float(temperature),
+                                                 seed=int(seed), **parameters)
+    simulated_annealing.value_bound = _eligible_components(minimal_regression).value_bound(
+        simulated_annealing.points_set.points[0], float(minimal_density))
+
+    statistics = None
+    if args.statistics:
+        statistics = Statistics()
+        simulated_annealing.add_observer(statistics)
+
+    if profile_file is None:
+        result, best = simulated_annealing.calculate()
+    else:
+        profiler = cProfile.Profile()
+        result, best = profiler.runcall(simulated_annealing.calculate)
+        profiler.dump_stats(profile_file)
+        print("Profile saved into {}, view it with: python -m pstats {}".format(profile_file, profile_file))
+    return simulated_annealing, result, best, statistics
+
+
+def _log_interval(parallel=False):
+    """
+    :param parallel: the run is one of many running at once
+    :return: --log_interval, by default 0 in parallel runs, so they do not flood the output, and 1 otherwise
+    """
+    if args.log_interval is not None:
+        return int(args.log_interval)
+    return 0 if parallel else 1
+
+
+def _cooling_schedule(t0):
+    """
+    :return: CoolingSchedule given in command line, starting at t0
+    """
+    return cooling_schedule(args.cooling, t0, rate=float(args.cooling_rate),
+                            epoch=int(args.epoch) if args.epoch is not None else None,
+                            reheat_after=int(args.reheat_after))
+
+
+def run_tempering(seed, temperature, minimal_density, minimal_regression):
+    """
+    Runs parallel tempering on the shared diagram, prints and saves its results
+
+    :return: ParallelTempering
+    """
+    starting_point = initiate(_eligible_components(minimal_regression), seed, minimal_density)
+    max_temperature = float(args.max_temperature) if args.max_temperature is not None else 100 * float(temperature)
+    parallel_tempering = ParallelTempering(
+        _delaunay_diagram, starting_point, float(minimal_density), float(minimal_regression),
+        temperature_ladder(float(temperature), max_temperature, int(args.replicas)),
+        max_iterations=int(args.max_iterations), swap_interval=int(args.swap_interval), seed=int(seed),
+        log_interval=_log_interval(),
+        value_bound=_eligible_components(minimal_regression).value_bound(starting_point, float(minimal_density)))
+    max_value, best = parallel_tempering.calculate()
+    parallel_tempering.save_history()
+
+    print()
+    print("Temperatures:", *('{:.6g}'.format(t) for t in parallel_tempering.temperatures))
+    print("Swaps accepted:", *('{:.3f}'.format(a) for a in parallel_tempering.swap_acceptance))
+    print()
+    print("Best result ({}) points, value {}:".format(len(best), max_value))
+    print(*(_delaunay_diagram.points[i] for i in best), sep=",\n")
+    _save_results([_result(dict(seed=seed, temperature=temperature, minimal_density=minimal_density,
+                                minimal_regression=minimal_regression), max_value, best)])
+    return parallel_tempering
+
+
+def run_multiresolution(seed, temperature, minimal_density, minimal_regression):
+    """
+    Runs annealing of clusters of points refined on the shared diagram, prints and saves its results
+
+    :return: MultiResolution
+    """
+    max_iterations = int(args.max_iterations)
+    multiresolution = MultiResolution(
+        _delaunay_diagram, float(minimal_density), float(minimal_regression), cell_size=float(args.cell_size),
+        temperature=float(temperature),
+        refine_temperature=float(args.refine_temperature) if args.refine_temperature is not None else None,
+        coarse_iterations=max_iterations,
+        max_iterations=int(args.refine_iterations) if args.refine_iterations is not None else max_iterations // 10,
+        seed=int(seed), promising_fraction=float(args.promising_fraction),
+        components=_eligible_components(minimal_regression),
+        cooling=_cooling_schedule,
+        history_interval=int(args.history_interval), log_interval=_log_interval(),
+        batch_size=int(args.batch_size), batch_selection=args.batch_selection, patience=int(args.patience))
+    result, best = multiresolution.calculate()
+    multiresolution.save_history()
+
+    print()
+    print("Final result ({}) points:".format(result.points_n))
+    print(*(_delaunay_diagram.points[i] for i in result.points), sep=",\n")
+    print()
+    print("Best result ({}) points, value {}:".format(len(best), multiresolution.max_value))
+    print(*(_delaunay_diagram.points[i] for i in best), sep=",\n")
+    _save_results([_result(dict(seed=seed, temperature=temperature, minimal_density=minimal_density,
+                                minimal_regression=minimal_regression), multiresolution.max_value, best,
+                           final_value=result.value)])
+    return multiresolution
+
+
+def run_partitioned(seed, temperature, minimal_density, minimal_regression):
+    """
+    Runs partitioned annealing on the shared diagram, prints and saves its results
+
+    :return: PartitionedAnnealing
+    """
+    max_iterations = int(args.max_iterations)
+    partitioned_annealing = PartitionedAnnealing(
+        _delaunay_diagram, float(minimal_density), float(minimal_regression), tiles=int(args.tiles),
+        halo=int(args.halo), temperature=float(temperature), max_iterations=max_iterations,
+        refine_iterations=int(args.refine_iterations) if args.refine_iterations is not None else max_iterations // 10,
+        seed=int(seed), processes=int(args.processes) if args.processes is not None else None,
+        components=_eligible_components(minimal_regression), promising_fraction=float(args.promising_fraction),
+        cooling=_cooling_schedule,
+        tile_log_interval=_log_interval(parallel=True),
+        history_interval=int(args.history_interval), log_interval=_log_interval(),
+        batch_size=int(args.batch_size), batch_selection=args.batch_selection, patience=int(args.patience))
+    result, best = partitioned_annealing.calculate()
+    partitioned_annealing.save_history()
+
+    print()
+    print("Final result ({}) points:".format(result.points_n))
+    print(*(_delaunay_diagram.points[i] for i in result.points), sep=",\n")
+    print()
+    print("Best result ({}) points, value {}:".format(len(best), partitioned_annealing.max_value))
+    print(*(_delaunay_diagram.points[i] for i in best), sep=",\n")
+    _save_results([_result(dict(seed=seed, temperature=temperature, minimal_density=minimal_density,
+                                minimal_regression=minimal_regression), partitioned_annealing.max_value, best,
+                           final_value=result.value)])
+    return partitioned_annealing
+
+
+def run_sweep(configurations):
+    """
+    Finds the largest connected region of eligible points for every configuration in a single pass over the shared
+    diagram and writes their values into args.results
+
+    :param configurations: list of dictionaries with SWEPT_PARAMETERS, seed and temperature are not used
+    :return: DataFrame of results
+    """
+    threshold_sweep = _threshold_sweep()
+    results = []
+    for minimal_density, minimal_regression in sorted(set((configuration['minimal_density'],
+                                                            configuration['minimal_regression'])
+                                                           for configuration in configurations)):
+        points_set = threshold_sweep.points_set(float(minimal_regression), float(minimal_density))
+        if points_set is None:
+            print("Points with regression above {} make no triangle".format(minimal_regression))
+            continue
+        results.append(dict(minimal_density=minimal_density, minimal_regression=minimal_regression,
+                            area=points_set.area, max_value=points_set.value,
+                            has_minimal_density=points_set.has_minimal_density, best_points_n=points_set.points_n,
+                            best_points=' '.join(str(i) for i in points_set.points)))
+
+    results = _save_results(results)
+
+    print()
+    print(results.drop(columns='best_points').to_string(index=False))
+    return results
+
+
+def _threshold_sweep():
+    global _sweep
+    if _sweep is None:
+        _sweep = ThresholdSweep(_delaunay_diagram)
+    return _sweep
+
+
+def _run_configuration(numbered_configuration):
+    number, configuration = numbered_configuration
+    profile_file = '{}.{}'.format(args.profile, number) if args.profile is not None else None
+    checkpoint_file = '{}.{}'.format(args.checkpoint, number) if args.checkpoint is not None else None
+    simulated_annealing, result, best, statistics = run(**configuration, profile_file=profile_file,
+                                                        checkpoint_file=checkpoint_file, parallel=True)
+    return _result(configuration, simulated_annealing.max_value, best, final_value=result.value,
+                   statistics=statistics.to_dict() if statistics is not None else None)
+
+
+def _result(configuration, max_value, best, final_value=None, statistics=None):
+    """
+    :param best: indices of the best points
+    :param final_value: value of the final set of the run, if it has one
+    :param statistics: dictionary of Statistics, if they were gathered
+    :return: dictionary of a row of results with the best region of a run
+    """
+    return dict(configuration, max_value=max_value, **({} if final_value is None else dict(final_value=final_value)),
+                best_points_n=len(best), best_points=' '.join(str(i) for i in best), **(statistics or {}))
+
+
+def _save_results(results):
+    """
+    Writes rows of results into args.results
+    """
+    results = pd.DataFrame(results)
+    results.to_csv(args.results, index=False)
+    print()
+    print("Results saved into {}".format(args.results))
+    return results
+
+
+def run_configurations(configurations):
+    """
+    Runs every configuration in a pool of processes forked from this one, so they share the diagram and its lists
+    built before, and writes the best region of each one into args.results
+
+    :param configurations: list of dictionaries with SWEPT_PARAMETERS
+    :return: None
+    """
+    processes = int(args.processes) if args.processes is not None else None
+    _delaunay_diagram.build_lists()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        results = pool.map(_run_configuration, enumerate(configurations), chunksize=1)
+
+    results = _save_results(results)
+
+    print()
+    print(results.drop(columns='best_points').to_string(index=False))
+
 
+def initiate(components, seed, minimal_density):
+    """
+    :param components: EligibleComponents for minimal regression of the run
+    :return: index of a random point from a promising component
+    """
+    if len(components) == 0:
+        raise ValueError("No point has regression above {}".format(components.minimal_regression))
 
-def initiate(points, seed, minimal_regression):
-    random.seed(a=seed)
-    while True:
-        point = random.choice(points)
-        if point.regression > float(minimal_regression):
-            return point
+    candidates = components.points(components.promising(float(minimal_density), float(args.promising_fraction)))
+    return int(np.random.default_rng(int(seed)).choice(candidates))
 
 
 if __name__ == '__main__':
@@ -1,17 +1,114 @@
 from src.points_set import PointsSet
+from src.cooling import Geometric
 
+import numpy as np
 import pandas as pd
 
-import random
+import json
 import math
+import os
 import signal
+import tempfile
+import time
+
+
+class History:
+    """
+    Area, value and max value of the points set, recorded every `interval` iterations into preallocated arrays
+    """
+    COLUMNS = ['area', 'value', 'max_value']
+    # rows as appended to history files of checkpoints
+    ROW = np.dtype([('iteration', np.int64)] + [(column, float) for column in COLUMNS])
+
+    def __init__(self, max_iterations, interval=1):
+        self._interval = interval
+        capacity = max_iterations // interval + 2
+        self._iterations = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty((capacity, len(self.COLUMNS)), dtype=float)
+        self._size = 0
+
+    def record(self, iteration, area, value, max_value, force=False):
+        """
+        :param force: record even if iteration is not a multiple of interval
+        :return: None
+        """
+        if iteration % self._interval != 0 and not force:
+            return
+        if self._size > 0 and self._iterations[self._size - 1] == iteration:
+            return
+        if self._size == len(self._iterations):
+            self._iterations = np.resize(self._iterations, 2 * self._size)
+            self._values = np.resize(self._values, (2 * self._size, len(self.COLUMNS)))
+
+        self._iterations[self._size] = iteration
+        self._values[self._size] = area, value, max_value
+        self._size += 1
+
+    def rows(self, start=0):
+        """
+        :return: array of ROW records of everything recorded from the start-th record on
+        """
+        rows = np.empty(self._size - start, dtype=self.ROW)
+        rows['iteration'] = self._iterations[start:self._size]
+        for i, column in enumerate(self.COLUMNS):
+            rows[column] = self._values[start:self._size, i]
+        return rows
+
+    def restore(self, iterations, values):
+        """
+        :param iterations: (R,) iterations of records, replacing everything recorded so far
+        :param values: (R, 3) recorded columns
+        :return: None
+        """
+        size = len(iterations)
+        if size > len(self._iterations):
+            self._iterations = np.empty(2 * size, dtype=np.int64)
+            self._values = np.empty((2 * size, len(self.COLUMNS)), dtype=float)
+        self._iterations[:size] = iterations
+        self._values[:size] = values
+        self._size = size
+
+    def to_data_frame(self):
+        """
+        :return: DataFrame with recorded columns, indexed by iteration
+        """
+        return pd.DataFrame(self._values[:self._size], index=self._iterations[:self._size], columns=self.COLUMNS)
+
+    def __len__(self):
+        return self._size
 
 
 class SimulatedAnnealing:
-    def __init__(self, points_set: PointsSet, temperature=1.0, max_iterations=100000, seed=1):
+    BATCH_SELECTIONS = ['metropolis', 'best']
+
+    def __init__(self, points_set: PointsSet, temperature=1.0, max_iterations=100000, seed=1,
+                 history_interval=1, log_interval=1, observers=(), batch_size=1, batch_selection='metropolis',
+                 checkpoint_file=None, checkpoint_interval=0, value_bound=None, cooling=None, patience=0):
+        """
+        :param history_interval: record history every that many iterations
+        :param log_interval: print state every that many iterations, 0 turns printing off
+        :param observers: instrumentation.Observer objects notified about the run
+        :param batch_size: number of candidates evaluated at once in every iteration, 1 evaluates a single one
+        :param batch_selection: how a move is picked from a batch, 'metropolis' makes the first candidate accepted
+        by Metropolis criterion, 'best' takes the best candidate and accepts it by Metropolis criterion
+        :param checkpoint_file: .npz file the state is saved into every checkpoint_interval iterations and when the
+        run ends or is stopped, see from_checkpoint, history recorded since the previous save is appended to a file
+        with .history added to its name
+        :param checkpoint_interval: 0 saves the state only at the end
+        :param value_bound: highest value the set can reach, e.g. from EligibleComponents, the run stops when it
+        is reached
+        :param cooling: CoolingSchedule starting at temperature, by default temperature * 0.95 ** iterations
+        :param patience: stop after that many iterations without improvement of the max value, 0 turns it off
+        """
+        if batch_selection not in self.BATCH_SELECTIONS:
+            raise ValueError("Unknown batch selection: {}".format(batch_selection))
+
         self._points_set = points_set
         self._temperature = temperature
         self._t0 = temperature
+        self._cooling = cooling if cooling is not None else Geometric(temperature)
+        self._patience = patience
+        self._last_improvement = 0
 
         self._max_iterations = max_iterations
         self._iterations = 0
@@ -19,76 +116,287 @@ class SimulatedAnnealing:
         signal.signal(signal.SIGINT, self.__signal_handler)
 
         self._max_value = 0
+        self._best_points = np.empty(0, dtype=np.int64)
+        # a warm started set is the best one until a better is found
+        if points_set.has_minimal_density and points_set.value > 0:
+            self._max_value = points_set.value
+            self._best_points = points_set.points
 
-        self._history = pd.DataFrame(columns=list(['area', 'value', 'max_value']))
+        self._history = History(max_iterations, history_interval)
+        self._log_interval = log_interval
+        self._last_logged = None
 
         self._seed = seed
-        # random.seed(a=seed)
+        # all random choices of the run come from this generator, so the run is reproducible from the seed
+        self._random = np.random.default_rng(seed)
+
+        self._observers = list(observers)
+
+        self._batch_size = batch_size
+        self._batch_selection = batch_selection
+
+        self._checkpoint_file = checkpoint_file
+        self._checkpoint_interval = checkpoint_interval
+        # number of history records in history files of checkpoints
+        self._saved_history = {}
+
+        self.value_bound = value_bound
+
+    @classmethod
+    def from_checkpoint(cls, filename, delaunay_diagram, **kwargs):
+        """
+        Restores a run saved by save_checkpoint, it continues exactly as the saved one would
+
+        :param delaunay_diagram: diagram of the saved run, ValueError is raised for a diagram of other points
+        :param kwargs: other parameters of the constructor, e.g. new max_iterations
+        :return: SimulatedAnnealing
+        """
+        with np.load(filename, allow_pickle=False) as checkpoint:
+            state = {name: checkpoint[name] for name in checkpoint.files}
+
+        if str(state['fingerprint']) != delaunay_diagram.fingerprint:
+            raise ValueError("Checkpoint {} was made for other points".format(filename))
+
+        simulated_annealing = cls(PointsSet.from_state(delaunay_diagram, state), temperature=float(state['t0']),
+                                  seed=int(state['seed']), **kwargs)
+        simulated_annealing._iterations = int(state['iterations'])
+        simulated_annealing._temperature = float(state['temperature'])
+        simulated_annealing._last_improvement = int(state['last_improvement'])
+        simulated_annealing._cooling.t0 = float(state['t0'])
+        simulated_annealing._cooling.restore(json.loads(str(state['cooling_state'])))
+        simulated_annealing._max_value = float(state['max_value'])
+        simulated_annealing._best_points = state['best_points']
+        simulated_annealing._random.bit_generator.state = json.loads(str(state['random_state']))
+        if 'history_offset' in state:
+            # records beyond the offset were appended after the checkpoint was saved
+            history_file = history_file_name(filename)
+            offset = int(state['history_offset'])
+            rows = np.fromfile(history_file, dtype=History.ROW, count=offset)
+            if len(rows) < offset:
+                raise ValueError("History file {} has less than {} records".format(history_file, offset))
+            os.truncate(history_file, offset * History.ROW.itemsize)
+            simulated_annealing._history.restore(rows['iteration'], np.stack([rows[c] for c in History.COLUMNS], axis=1))
+            simulated_annealing._saved_history[history_file] = offset
+        else:
+            # older checkpoints held the whole history
+            simulated_annealing._history.restore(state['history_iterations'], state['history_values'])
+        simulated_annealing._last_logged = simulated_annealing._iterations
+        return simulated_annealing
+
+    def save_checkpoint(self, filename=None):
+        """
+        Saves the state of the run, replacing the file only after the whole state is written. History is appended
+        to the checkpoint's history file before, so the checkpoint keeps only the number of its records.
+
+        :param filename: checkpoint_file by default
+        :return: None
+        """
+        if filename is None:
+            filename = self._checkpoint_file
+        history_file = history_file_name(filename)
+        saved = self._saved_history.get(history_file, 0)
+        with open(history_file, 'ab' if history_file in self._saved_history else 'wb') as file:
+            file.write(self._history.rows(saved).tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        self._saved_history[history_file] = len(self._history)
+
+        state = dict(self._points_set.state(), history_offset=len(self._history),
+                     fingerprint=self._points_set.delaunay_diagram.fingerprint,
+                     seed=self._seed, t0=self._t0, temperature=self._temperature, iterations=self._iterations,
+                     max_value=self._max_value, best_points=self._best_points,
+                     last_improvement=self._last_improvement, cooling_state=json.dumps(self._cooling.state()),
+                     random_state=json.dumps(self._random.bit_generator.state))
+
+        directory = os.path.dirname(os.path.abspath(filename))
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(filename), suffix='.tmp',
+                                         delete=False) as file:
+            np.savez(file, **state)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(file.name, filename)
+
+    def add_observer(self, observer):
+        self._observers.append(observer)
 
     def __signal_handler(self, signal, frame):
         print('Algorithm manually stopped.')
         self._time_to_stop = True
 
     def _annealing_rate(self, old_value, new_value):
+        if self._temperature <= 0:
+            return 0.0
         return math.exp(-abs(new_value - old_value) / self._temperature)
 
+    def _select(self, candidates, evaluate, evaluate_batch, old_value):
+        """
+        :param candidates: IndexedSet of points to add or remove
+        :param evaluate: function giving value of the set after the move
+        :param evaluate_batch: the same for an array of points
+        :return: selected point, value after its move and whether the move is accepted
+        """
+        if self._batch_size == 1:
+            point = candidates.pick(self._random)
+            new_value = evaluate(point)
+            return point, new_value, (new_value > old_value or
+                                      self._random.random() < self._annealing_rate(old_value, new_value))
+
+        points = candidates.sample(self._random, self._batch_size)
+        values = evaluate_batch(points)
+
+        if self._batch_selection == 'best':
+            best = int(np.argmax(values))
+            new_value = float(values[best])
+            return points[best], new_value, (new_value > old_value or
+                                             self._random.random() < self._annealing_rate(old_value, new_value))
+
+        # candidates are in random order, so the first accepted one is what single proposals would have found
+        rates = np.exp(-np.abs(values - old_value) / self._temperature) if self._temperature > 0 else 0.0
+        accepted = (values > old_value) | (self._random.random(len(points)) < rates)
+        first = int(np.argmax(accepted))
+        return points[first], float(values[first]), bool(accepted[first])
+
     def _next_iteration(self):
+        if len(self._points_set.points_to_add) + len(self._points_set.points_to_remove) == 0:
+            print('No points to add or remove.')
+            self._time_to_stop = True
+            return
+
         self._iterations += 1
-        # decide whether to add a point or remove it
+        # decide whether to add a point or remove it, then select the point
         adding_probability = len(self._points_set.points_to_add) / (len(self._points_set.points_to_add)
                                                                     + len(self._points_set.points_to_remove))
 
-        if random.random() <= adding_probability:
-            # select point to add
-            point = random.sample(self._points_set.points_to_add, 1)[0]
-
-            old_value = self._points_set.value
-            new_value = self._points_set.value_with_added(point)
-
-            if new_value > old_value:
-                self._points_set.add_point(point)
-            elif random.random() < self._annealing_rate(old_value, new_value):
-                self._points_set.add_point(point)
-
+        if self._random.random() <= adding_probability:
+            kind = 'add'
+            candidates = self._points_set.points_to_add
+            evaluate, evaluate_batch = self._points_set.value_with_added, self._points_set.values_with_added
+            move = self._points_set.add_point
         else:
-            # select point to remove
-            point = random.sample(self._points_set.points_to_remove, 1)[0]
+            kind = 'remove'
+            candidates = self._points_set.points_to_remove
+            evaluate, evaluate_batch = self._points_set.value_with_removed, self._points_set.values_with_removed
+            move = self._points_set.remove_point
 
-            old_value = self._points_set.value
-            new_value = self._points_set.value_with_removed(point)
-
-            if new_value > old_value:
-                self._points_set.remove_point(point)
-            elif random.random() < self._annealing_rate(old_value, new_value):
-                self._points_set.remove_point(point)
+        old_value = self._points_set.value
+        if not self._observers:
+            point, new_value, accepted = self._select(candidates, evaluate, evaluate_batch, old_value)
+            if accepted:
+                move(point)
+        else:
+            start = time.perf_counter()
+            point, new_value, accepted = self._select(candidates, evaluate, evaluate_batch, old_value)
+            evaluated = time.perf_counter()
+            if accepted:
+                move(point)
+            moved = time.perf_counter()
+            for observer in self._observers:
+                observer.moved(kind, point, old_value, new_value, accepted, evaluated - start, moved - evaluated)
 
-        # similar to built-in mathlab way for simulated annealing
-        self._temperature = self._t0 * math.pow(0.95, self._iterations)
+        return accepted
 
-    def calculate(self):
-        best_points = set()
+    def calculate(self, iterations=None):
+        """
+        :param iterations: stop after that many iterations, even before max_iterations, so the run can be continued
+        by calling calculate again
+        :return: final PointsSet and indices of the best points
+        """
+        last_iteration = self._max_iterations if iterations is None else min(self._max_iterations,
+                                                                              self._iterations + iterations)
+        for observer in self._observers:
+            observer.started(self)
         self.log()
-        while self._iterations < self._max_iterations and not self._time_to_stop:
-            self._next_iteration()
-            if self._points_set.has_minimal_density and self._points_set.value > self._max_value:
+        while self._iterations < last_iteration and not self._time_to_stop:
+            accepted = self._next_iteration()
+            if self._time_to_stop:
+                break
+            improved = self._points_set.has_minimal_density and self._points_set.value > self._max_value
+            if improved:
                 self._max_value = self._points_set.value
-                best_points = set(self._points_set.points)
+                self._best_points = self._points_set.points
+                self._last_improvement = self._iterations
+                # areas are summed in other order than in the bound, hence the tolerance
+                if self.value_bound is not None and self._max_value >= self.value_bound * (1 - 1e-9):
+                    print('Highest possible value reached.')
+                    self._time_to_stop = True
+            elif self._patience > 0 and self._iterations - self._last_improvement >= self._patience:
+                print('No improvement in {} iterations.'.format(self._patience))
+                self._time_to_stop = True
+            self._temperature = self._cooling.next_temperature(self._iterations, accepted, improved)
+            for observer in self._observers:
+                observer.iteration_finished(self)
             self.log()
-        return self._points_set, best_points
+            if self._checkpoint_file is not None and self._checkpoint_interval > 0 \
+                    and self._iterations % self._checkpoint_interval == 0:
+                self.save_checkpoint()
+        self.log(force=True)
+        if self._checkpoint_file is not None:
+            self.save_checkpoint()
+        for observer in self._observers:
+            observer.finished(self)
+        return self._points_set, self._best_points
+
+    def log(self, force=False):
+        """
+        :param force: record and print the state regardless of intervals
+        :return: None
+        """
+        self._history.record(self._iterations, self._points_set.area, self._points_set.value, self._max_value,
+                             force=force)
+        if self._log_interval == 0 or self._last_logged == self._iterations:
+            return
+        if self._iterations % self._log_interval != 0 and not force:
+            return
+        self._last_logged = self._iterations
 
-    def log(self):
         print("{}/{}:\tArea\t{}\tValue\t{}\tMax Value\t{}\tMinimal Density\t{}\tDensity\t{}"
               .format(self._iterations, self._max_iterations, self._points_set.area,
                       self._points_set.value, self._max_value, self._points_set._minimal_point_density,
-                      len(self._points_set.points) / self._points_set.area if self._points_set.area > 0 else 0))
-        self._history = self._history.append({'area': self._points_set.area,
-                                              'value': self._points_set.value,
-                                              'max_value': self._max_value},
-                                             ignore_index=True)
+                      self._points_set.points_n / self._points_set.area if self._points_set.area > 0 else 0))
+
+    def save_history(self, filename=None):
+        if filename is None:
+            filename = '../out/t-{}-s-{}.csv'.format(self._t0, self._seed)
+        self._history.to_data_frame().to_csv(filename)
+
+    @property
+    def points_set(self):
+        return self._points_set
 
-    def save_history(self):
-        self._history.to_csv('../out/t-{}-s-{}.csv'.format(self._t0, self._seed))
+    @property
+    def iterations(self):
+        return self._iterations
+
+    @property
+    def temperature(self):
+        return self._temperature
+
+    @temperature.setter
+    def temperature(self, temperature):
+        """
+        Sets temperature of the next iteration, the cooling schedule decides about the following ones
+        """
+        self._temperature = temperature
+
+    @property
+    def time_to_stop(self):
+        return self._time_to_stop
+
+    @property
+    def best_points(self):
+        return self._best_points
+
+    @property
+    def max_value(self):
+        return self._max_value
 
     @property
     def history(self):
-        return self._history
+        return self._history.to_data_frame()
+
+
+def history_file_name(checkpoint_file):
+    """
+    :return: name of the file history of the run saved in the checkpoint is appended to
+    """
+    return checkpoint_file + '.history'
@@ -0,0 +1,131 @@
+from src.points_set import PointsSet
+from src.components import connected_region
+
+import numpy as np
+import pandas as pd
+
+
+class ThresholdSweep:
+    """
+    Largest region of triangles connected through common edges, with all corners having regression above a minimal
+    one, for every minimal regression at once. A triangle is eligible for minimal regressions below the lowest
+    regression of its corners, so triangles are added in descending order of that into a union-find of triangles,
+    which keeps areas of components. The largest component after every addition answers all thresholds between
+    that triangle and the next one. Its corners may make triangles of other components too, which a PointsSet of
+    them would contain, so the region is the part of them given by connected_region.
+
+    Arrays:
+     - thresholds: (T,) lowest regression of corners of triangles, in the order they are added (descending)
+     - order: (T,) indices of triangles in that order
+     - component_areas: (T,) area of the largest component after adding the first i + 1 triangles, which bounds the
+       area of the region
+     - largest_triangles: (T,) a triangle of that component
+    """
+
+    def __init__(self, delaunay_diagram):
+        self._delaunay = delaunay_diagram
+        keys = delaunay_diagram.regressions[delaunay_diagram.simplices].min(axis=1)
+        self.order = np.argsort(-keys, kind='stable')
+        self.thresholds = keys[self.order]
+
+        triangles_n = len(keys)
+        parents = list(range(triangles_n))
+        areas = delaunay_diagram.areas.tolist()
+        adjacent = delaunay_diagram.triangle_adjacency_list
+        added = [False] * triangles_n
+
+        def find(t):
+            root = t
+            while parents[root] != root:
+                root = parents[root]
+            while parents[t] != root:
+                parents[t], t = root, parents[t]
+            return root
+
+        largest_areas = []
+        largest_triangles = []
+        largest_area = 0
+        largest_triangle = -1
+        for t in self.order.tolist():
+            added[t] = True
+            root = t
+            for a in adjacent[t]:
+                if not added[a]:
+                    continue
+                other = find(a)
+                if other == root:
+                    continue
+                # union by area, the larger component's root stays
+                if areas[other] > areas[root]:
+                    root, other = other, root
+                parents[other] = root
+                areas[root] += areas[other]
+            if areas[root] > largest_area:
+                largest_area = areas[root]
+                largest_triangle = root
+            largest_areas.append(largest_area)
+            largest_triangles.append(largest_triangle)
+
+        self.component_areas = np.array(largest_areas)
+        self.largest_triangles = np.array(largest_triangles, dtype=np.int64)
+
+    def _added(self, minimal_regression):
+        """
+        :return: number of triangles eligible for the minimal regression
+        """
+        return int(np.searchsorted(-self.thresholds, -minimal_regression, side='left'))
+
+    def largest_area(self, minimal_regression):
+        """
+        :return: area of the largest connected region of points with regression above minimal, 0 if there is none
+        """
+        triangles, _ = self.region(minimal_regression)
+        return float(self._delaunay.areas[triangles].sum())
+
+    def region(self, minimal_regression):
+        """
+        :return: indices of triangles and of points of the largest connected region of points with regression above
+        minimal, empty arrays if there is none
+        """
+        added = self._added(minimal_regression)
+        if added == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        eligible = np.zeros(len(self.order), dtype=bool)
+        eligible[self.order[:added]] = True
+        adjacent = self._delaunay.triangle_adjacency_list
+        start = int(self.largest_triangles[added - 1])
+        triangles = {start}
+        reached = [start]
+        while len(reached) > 0:
+            t = reached.pop()
+            for a in adjacent[t]:
+                if eligible[a] and a not in triangles:
+                    triangles.add(a)
+                    reached.append(a)
+
+        points = connected_region(self._delaunay, np.unique(self._delaunay.simplices[sorted(triangles)]))
+        in_region = np.zeros(self._delaunay.points_n, dtype=bool)
+        in_region[points] = True
+        return np.flatnonzero(in_region[self._delaunay.simplices].all(axis=1)), points
+
+    def points_set(self, minimal_regression, minimal_point_density):
+        """
+        :return: PointsSet of the largest region, e.g. as a starting region of simulated annealing, None if there is
+        no region
+        """
+        _, points = self.region(minimal_regression)
+        if len(points) == 0:
+            return None
+        return PointsSet.from_points(self._delaunay, points, minimal_point_density, minimal_regression)
+
+    def to_data_frame(self):
+        """
+        :return: DataFrame with the area of the largest component of eligible triangles of points with regression at
+        least lowest_regression, for every distinct threshold, the same as for minimal regressions from the next lower
+        threshold up to it, which bounds the area of the region
+        """
+        last = np.append(self.thresholds[1:] != self.thresholds[:-1], True)
+        return pd.DataFrame(dict(lowest_regression=self.thresholds[last],
+                                 largest_component_area=self.component_areas[last],
+                                 eligible_triangles_n=np.flatnonzero(last) + 1))
@@ -1,16 +1,70 @@
-import sys
+import argparse
+import os
 
 import matplotlib.pyplot as plt
 import numpy as np
-from scipy.misc import imread
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 
-from src.point import load_from_csv
+from src.delaunay_diagram import DelaunayDiagram, diagram_cache_file
+from src.point import load_table_from_csv, cartesian_coordinates
 
 
-def add_sphere(subplot, center, radius, color):
+MAP_IMAGE = os.path.join(os.path.dirname(__file__), 'resource', 'equidstant-projection.jpg')
+
+# formats written with plotly, the others are written with matplotlib
+INTERACTIVE_FORMATS = ['.html']
+
+
+def regression_colors(regressions, minimal=None, maximal=None, colormap=None):
+    """
+    :param regressions: (N,) array of regressions
+    :param minimal, maximal: regressions mapped to the ends of the scale, the lowest and the highest by default
+    :param colormap: name of a matplotlib colormap, by default blue for the lowest, through purple, to red for the
+    highest regression
+    :return: (N, 3) array of RGB colors
+    """
+    regressions = np.asarray(regressions, dtype=float)
+    minimal = regressions.min() if minimal is None else minimal
+    maximal = regressions.max() if maximal is None else maximal
+    range_ = maximal - minimal
+    normalized = np.clip((regressions - minimal) / range_, 0, 1) if range_ > 0 else np.full(len(regressions), 0.5)
+
+    if colormap is not None:
+        return plt.get_cmap(colormap)(normalized)[:, :3]
+
+    colors = np.zeros((len(regressions), 3))
+    colors[:, 0] = np.minimum(1, 2 * normalized)
+    colors[:, 2] = np.minimum(1, 2 * (1 - normalized))
+    return colors
+
+
+def region_triangles(delaunay_diagram, points):
+    """
+    :param points: indices of points of a region, e.g. best points of an annealing run
+    :return: (T, 3) indices of corners of the region's triangles
+    """
+    in_region = np.zeros(delaunay_diagram.points_n, dtype=bool)
+    in_region[points] = True
+    return delaunay_diagram.simplices[in_region[delaunay_diagram.simplices].all(axis=1)]
+
+
+def _border_edges(triangles):
+    """
+    :return: (E, 2) edges of only one of the triangles
+    """
+    edges = np.sort(np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]]), axis=1)
+    edges, counts = np.unique(edges, axis=0, return_counts=True)
+    return edges[counts == 1]
+
+
+def add_sphere(subplot, center, radius, color, resolution=30):
     # based on https://stackoverflow.com/a/31775938/7108762
     radius *= 0.99
-    phi, theta = np.mgrid[0.0:2.0 * np.pi:100j, 0.0:2.0 * np.pi:100j]
+    phi, theta = np.mgrid[0.0:2.0 * np.pi:resolution * 1j, 0.0:2.0 * np.pi:resolution * 1j]
     x = center[0] + radius * np.cos(phi) * np.cos(theta)
     y = center[1] + radius * np.cos(phi) * np.sin(theta)
     z = center[2] + radius * np.sin(phi)
@@ -19,82 +73,193 @@ def add_sphere(subplot, center, radius, color):
         x, y, z,  rstride=1, cstride=1, color=color, alpha=0.4, linewidth=0)
 
 
-def _visualise_on_sphere(points, colors):
+def _visualise_on_sphere(figure, latitudes, longitudes, colors, triangles=None):
     center = 0.5, 0.5, 0.5
     radius = 0.5
 
-    coords = [point.get_cartesian_coordinates(center, radius) for point in points]
-    xx, yy, zz = zip(*coords)
+    coords = cartesian_coordinates(latitudes, longitudes, center, radius)
+    xx, yy, zz = coords.T
 
-    fig = plt.figure()
-    subplot = fig.add_subplot(1, 1, 1, projection="3d")
+    subplot = figure.add_subplot(1, 1, 1, projection="3d")
 
     add_sphere(subplot, center, radius, "green")
 
-    subplot.scatter(xx, yy, zz, color=colors, s=20)
+    # dense scatters are drawn as images in vector formats
+    subplot.scatter(xx, yy, zz, color=colors, s=20 if len(xx) < 10000 else 2, rasterized=True)
+
+    if triangles is not None and len(triangles) > 0:
+        subplot.add_collection3d(Poly3DCollection(coords[triangles], facecolor='yellow', edgecolor='none',
+                                                  alpha=0.5, rasterized=True))
 
     subplot.set_xlim([0, 1])
     subplot.set_ylim([0, 1])
     subplot.set_zlim([0, 1])
     subplot.set_aspect("equal")
 
-    plt.tight_layout()
-    plt.show()
 
+def _visualise_as_map(figure, latitudes, longitudes, colors, triangles=None):
+    xx = np.asarray(longitudes) / 180
+    yy = 0.5 + np.asarray(latitudes) / 180
 
-def _visualise_as_map(points, colors):
-    xx = [p.longitude / 180 for p in points]
-    yy = [0.5 + p.latitude / 180 for p in points]
+    subplot = figure.add_subplot(1, 1, 1)
+    subplot.imshow(plt.imread(MAP_IMAGE), zorder=0, extent=[-1., 1., 0., 1.])
 
-    img = imread("src/resource/equidstant-projection.jpg")
-    plt.imshow(img, zorder=0, extent=[-1., 1., 0., 1.])
+    subplot.scatter(xx, yy, c=colors, s=20 if len(xx) < 10000 else 1, linewidths=0, rasterized=True)
 
-    plt.scatter(xx, yy, c=colors)
-    plt.show()
+    if triangles is not None and len(triangles) > 0:
+        corners = np.stack([xx[triangles], yy[triangles]], axis=-1)
+        # triangles crossing the antimeridian would span the whole map
+        corners = corners[np.ptp(corners[:, :, 0], axis=1) < 1]
+        subplot.add_collection(PolyCollection(corners, facecolor='yellow', edgecolor='none', alpha=0.5,
+                                              rasterized=True))
+        border = _border_edges(triangles)
+        border = np.stack([xx[border], yy[border]], axis=-1)
+        subplot.add_collection(LineCollection(border[np.ptp(border[:, :, 0], axis=1) < 1], colors='yellow',
+                                              linewidths=0.8))
+
+    subplot.set_xlim([-1, 1])
+    subplot.set_ylim([0, 1])
 
 
-def visualise(points, color_mapper, as_map=False):
+def _hex_colors(colors):
+    """
+    :return: array of '#rrggbb' strings of (N, 3) RGB colors
     """
+    rgb = np.round(np.asarray(colors)[:, :3] * 255).astype(np.int64)
+    return np.char.mod('#%06x', (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2])
 
-    :param points: iterable collection of points
-    :param color_mapper: function that as an argument takes point and returns it's color
-    :param as_map:
+
+def _save_interactive(filename, latitudes, longitudes, colors, labels=None, triangles=None, as_map=True,
+                      max_points=50000, seed=0):
+    """
+    Writes a plotly page with at most max_points points, chosen at random, and border of the region's triangles
+    """
+    import plotly.graph_objects as go
+
+    shown = np.arange(len(latitudes))
+    if len(shown) > max_points:
+        shown = np.sort(np.random.default_rng(seed).choice(shown, max_points, replace=False))
+
+    figure = go.Figure(go.Scattergeo(lat=latitudes[shown], lon=longitudes[shown], mode='markers',
+                                     text=labels[shown] if labels is not None else None,
+                                     marker=dict(color=_hex_colors(colors[shown]), size=3 if len(shown) > 10000
+                                                 else 6),
+                                     name='points'))
+
+    if triangles is not None and len(triangles) > 0:
+        # border edges as one line broken by gaps
+        border = _border_edges(triangles)
+        gaps = np.full((len(border), 1), np.nan)
+        figure.add_trace(go.Scattergeo(lat=np.hstack([latitudes[border], gaps]).ravel(),
+                                       lon=np.hstack([longitudes[border], gaps]).ravel(), mode='lines',
+                                       line=dict(color='yellow', width=2), name='region'))
+
+    figure.update_geos(projection_type='equirectangular' if as_map else 'orthographic', showland=True)
+    figure.update_layout(margin=dict(l=0, r=0, t=0, b=0))
+    figure.write_html(filename)
+
+
+def render(latitudes, longitudes, colors, filename=None, as_map=True, triangles=None, labels=None,
+           max_points=50000, dpi=150):
+    """
+    :param latitudes, longitudes: (N,) arrays of coordinates in degrees
+    :param colors: (N, 3) array of RGB colors
+    :param filename: .html file is written with plotly, other formats (.png, .svg, .pdf) with matplotlib without any
+    display, the plot is shown in a window if not given
+    :param triangles: (T, 3) indices of corners of a region's triangles to draw over the points
+    :param labels: (N,) names of points, shown in .html files
+    :param max_points: points drawn in .html files, the rest is left out at random
     :return: None
     """
-    colors = [color_mapper(point) for point in points]
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+
+    if filename is not None and os.path.splitext(filename)[1].lower() in INTERACTIVE_FORMATS:
+        _save_interactive(filename, latitudes, longitudes, np.asarray(colors), labels, triangles, as_map,
+                          max_points)
+        return
+
+    # a figure that is not shown is not attached to pyplot, so no display is needed
+    figure = plt.figure() if filename is None else Figure(figsize=(12, 6) if as_map else (8, 8))
+    if filename is not None:
+        FigureCanvasAgg(figure)
 
-    if not as_map:
-        _visualise_on_sphere(points, colors)
+    if as_map:
+        _visualise_as_map(figure, latitudes, longitudes, colors, triangles)
     else:
-        _visualise_as_map(points, colors)
+        _visualise_on_sphere(figure, latitudes, longitudes, colors, triangles)
+    figure.tight_layout()
 
+    if filename is None:
+        plt.show()
+    else:
+        figure.savefig(filename, dpi=dpi)
 
-def main():
-    if len(sys.argv) != 2:
-        exit("Invalid argument number. Required: .csv file name with points")
 
-    points = load_from_csv(sys.argv[1])
+def visualise(points, color_mapper, as_map=False, filename=None):
+    """
 
-    min_regression = min(points, key=lambda p: p.regression).regression
-    max_regression = max(points, key=lambda p: p.regression).regression
-    avg_regression = sum([p.regression for p in points]) / len(points)
+    :param points: iterable collection of points
+    :param color_mapper: function that as an argument takes point and returns it's color
+    :param as_map:
+    :param filename: file to write the plot into, see render
+    :return: None
+    """
+    points = list(points)
+    colors = np.array([color_mapper(point) for point in points], dtype=float)
 
-    print("Minimal regression coefficent in data: {}".format(min_regression))
-    print("Maximal regression coefficent in data: {}".format(max_regression))
-    print("Average regression coefficent in data: {}".format(avg_regression))
-    print("Number of data points: {}".format(len(points)))
+    render([p.latitude for p in points], [p.longitude for p in points], colors, filename=filename, as_map=as_map)
 
-    def regression_color_mapper(point):
-        range_ = max_regression - min_regression
 
-        regression_normalized = (point.regression - min_regression) / range_
+def best_points(results_file):
+    """
+    :param results_file: .csv file of results with max_value and best_points columns, as written by
+    run_simulated_annealing, or .npz checkpoint of a run
+    :return: indices of the best points of the row with the highest max value, or of the checkpoint's run
+    """
+    if os.path.splitext(results_file)[1].lower() == '.npz':
+        with np.load(results_file, allow_pickle=False) as checkpoint:
+            return checkpoint['best_points']
 
-        blue_val = 1 if regression_normalized < 0.5 else 2 * (1 - regression_normalized)
-        red_val = 1 if regression_normalized > 0.5 else 2 * regression_normalized
+    results = pd.read_csv(results_file)
+    best = results.loc[results['max_value'].idxmax(), 'best_points']
+    return np.array(str(best).split(), dtype=np.int64) if pd.notna(best) else np.empty(0, dtype=np.int64)
 
-        return red_val, 0, blue_val
 
-    visualise(points, regression_color_mapper, as_map=True)
+def main():
+    parser = argparse.ArgumentParser(description='Draw points colored by regression on a map or a sphere')
+    parser.add_argument('data', help='.csv file name with points')
+    parser.add_argument('--sphere', action='store_true', help='draw points on a sphere instead of a map')
+    parser.add_argument('--output', default=None, help='.png, .svg, .pdf or .html file to write, the plot is shown '
+                                                       'in a window if not given')
+    parser.add_argument('--colormap', default=None, help='matplotlib colormap, blue to red by default')
+    parser.add_argument('--region', default=None, help='results .csv or checkpoint .npz of run_simulated_annealing, '
+                                                       'triangles of best points of the best run are drawn over the '
+                                                       'points')
+    parser.add_argument('--max_points', default=50000, type=int, help='points drawn in .html file')
+    parser.add_argument('--dpi', default=150, type=int)
+    parser.add_argument('--cache', action='store_true', help='cache parsed points and diagram next to the data file')
+    args = parser.parse_args()
+
+    table = load_table_from_csv(args.data, cache=args.cache)
+    regressions = table.regressions
+
+    print("Minimal regression coefficent in data: {}".format(regressions.min()))
+    print("Maximal regression coefficent in data: {}".format(regressions.max()))
+    print("Average regression coefficent in data: {}".format(regressions.mean()))
+    print("Number of data points: {}".format(len(table)))
+
+    triangles = None
+    if args.region is not None:
+        delaunay_diagram = DelaunayDiagram(table, cache_file=diagram_cache_file(args.data) if args.cache else None)
+        triangles = region_triangles(delaunay_diagram, best_points(args.region))
+        print("Region: {} triangles".format(len(triangles)))
+
+    render(table.latitudes, table.longitudes, regression_colors(regressions, colormap=args.colormap),
+           filename=args.output, as_map=not args.sphere, triangles=triangles, labels=table.labels,
+           max_points=args.max_points, dpi=args.dpi)
+    if args.output is not None:
+        print("Saved {}".format(args.output))
 
 
 if __name__ == '__main__':
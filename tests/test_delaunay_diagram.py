@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from src.delaunay_diagram import DelaunayDiagram
+import src.point as point
+
+
+def random_table(rng, n, first_label=0):
+    """
+    :return: PointsTable of n points spread evenly over the sphere
+    """
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    longitudes = rng.uniform(-180, 180, n)
+    return point.PointsTable(['p{}'.format(first_label + i) for i in range(n)], latitudes, longitudes,
+                             rng.normal(size=n))
+
+
+def triangle_keys(diagram, triangles):
+    return [tuple(sorted(diagram.simplices_list[t])) for t in triangles]
+
+
+def assert_same_as_rebuilt(diagram):
+    rebuilt = DelaunayDiagram(diagram._table)
+
+    assert sorted(triangle_keys(diagram, range(len(diagram.simplices)))) == \
+        sorted(triangle_keys(rebuilt, range(len(rebuilt.simplices))))
+
+    order = {key: t for t, key in enumerate(triangle_keys(rebuilt, range(len(rebuilt.simplices))))}
+    matching = [order[key] for key in triangle_keys(diagram, range(len(diagram.simplices)))]
+    np.testing.assert_allclose(diagram.areas, rebuilt.areas[matching])
+
+    for t, adjacent in enumerate(diagram.triangle_adjacency_list):
+        assert sorted(order[key] for key in triangle_keys(diagram, adjacent)) == \
+            sorted(rebuilt.triangle_adjacency_list[matching[t]])
+        corners = diagram.simplices_list[t]
+        for i, a in enumerate(adjacent):
+            assert {corners[i], corners[(i + 1) % 3]} <= set(diagram.simplices_list[a])
+
+    assert sorted(map(tuple, diagram.edges.tolist())) == sorted(map(tuple, rebuilt.edges.tolist()))
+    for (a, b), triangles in zip(diagram.edges.tolist(), diagram.edge_triangles_list):
+        assert all({a, b} <= set(diagram.simplices_list[t]) for t in triangles)
+
+    for neighbours, rebuilt_neighbours in zip(diagram.neighbours_list, rebuilt.neighbours_list):
+        assert sorted(neighbours) == sorted(rebuilt_neighbours)
+    for triangles, rebuilt_triangles in zip(diagram.triangles_by_points_list, rebuilt.triangles_by_points_list):
+        assert sorted(triangle_keys(diagram, triangles)) == sorted(triangle_keys(rebuilt, rebuilt_triangles))
+
+    assert diagram.fingerprint == rebuilt.fingerprint
+
+
+def assert_lists_match_arrays(diagram):
+    assert diagram.regressions_list == diagram.regressions.tolist()
+    assert diagram.simplices_list == diagram.simplices.tolist()
+    assert diagram.areas_list == diagram.areas.tolist()
+    assert diagram.triangle_adjacency_list == diagram.triangle_adjacency.tolist()
+    assert diagram.edge_triangles_list == diagram.edge_triangles.tolist()
+    assert len(diagram.neighbour_indptr) == len(diagram.point_triangle_indptr) == diagram.points_n + 1
+    for p in range(diagram.points_n):
+        neighbours = diagram.neighbour_indices[diagram.neighbour_indptr[p]:diagram.neighbour_indptr[p + 1]]
+        triangles = diagram.point_triangle_indices[diagram.point_triangle_indptr[p]:diagram.point_triangle_indptr[p + 1]]
+        assert sorted(neighbours.tolist()) == sorted(diagram.neighbours_list[p])
+        assert sorted(triangles.tolist()) == sorted(diagram.triangles_by_points_list[p])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_insert_and_remove_match_rebuilt_diagram(seed):
+    rng = np.random.default_rng(seed)
+    diagram = DelaunayDiagram(random_table(rng, 300))
+    added = 300
+    # lists and indices built before the changes are patched by them
+    assert_lists_match_arrays(diagram)
+
+    for _ in range(6):
+        if rng.random() < 0.5:
+            n = int(rng.integers(1, 30))
+            diagram.insert_points(random_table(rng, n, added))
+            added += n
+        else:
+            removed = rng.choice(diagram.points_n, int(rng.integers(1, 30)), replace=False)
+            labels = diagram.labels.tolist()
+            new_indices = diagram.remove_points(removed)
+
+            kept = np.flatnonzero(new_indices >= 0)
+            assert sorted(new_indices[removed].tolist()) == [-1] * len(removed)
+            assert [diagram.labels[new_indices[i]] for i in kept] == [labels[i] for i in kept]
+        assert_lists_match_arrays(diagram)
+        assert_same_as_rebuilt(diagram)
+
+
+def test_points_are_kept_with_their_indices():
+    rng = np.random.default_rng(0)
+    diagram = DelaunayDiagram(random_table(rng, 100).to_points())
+
+    diagram.insert_points(random_table(rng, 10, 100).to_points())
+    diagram.remove_points([0, 50, 105])
+
+    assert [p.label for p in diagram.points] == diagram.labels.tolist()
+
+
+def test_changes_of_loaded_diagram(tmp_path):
+    rng = np.random.default_rng(0)
+    table = random_table(rng, 200)
+    cache_file = str(tmp_path / 'diagram.npz')
+    diagram = DelaunayDiagram(table, cache_file=cache_file)
+    diagram.remove_points(range(10))
+    diagram.save(cache_file)
+
+    loaded = DelaunayDiagram(diagram._table, cache_file=cache_file)
+    loaded.insert_points(random_table(rng, 20, 200))
+    loaded.remove_points(range(0, 100, 7))
+
+    assert_same_as_rebuilt(loaded)
+
+
+def test_inserting_existing_point_fails():
+    rng = np.random.default_rng(0)
+    table = random_table(rng, 50)
+    diagram = DelaunayDiagram(table)
+    assert_lists_match_arrays(diagram)
+    simplices = diagram.simplices.copy()
+
+    with pytest.raises(ValueError):
+        diagram.insert_points(point.PointsTable.from_points([random_table(rng, 1, 50)[0], table[3]]))
+    with pytest.raises(ValueError):
+        diagram.insert_points(point.PointsTable.from_points([random_table(rng, 1, 51)[0]] * 2))
+
+    assert diagram.points_n == 50
+    np.testing.assert_array_equal(diagram.simplices, simplices)
+    assert_lists_match_arrays(diagram)
+    assert_same_as_rebuilt(diagram)
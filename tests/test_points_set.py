@@ -0,0 +1,170 @@
+import numpy as np
+import pytest
+
+from src.components import connected_region
+from src.delaunay_diagram import DelaunayDiagram
+from src.points_set import PointsSet
+import src.point as point
+
+
+def random_diagram(rng, n):
+    """
+    :return: DelaunayDiagram of n points spread evenly over the sphere, with normally distributed regressions
+    """
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    longitudes = rng.uniform(-180, 180, n)
+    return DelaunayDiagram(point.PointsTable(['p{}'.format(i) for i in range(n)], latitudes, longitudes,
+                                             rng.normal(size=n)))
+
+
+def can_remove(diagram, points, triangles, point):
+    """
+    Removability checked over the whole set, as it was before it was tracked incrementally
+    """
+    if points.sum() == 1:
+        return False
+    if points.sum() <= 3:
+        return True
+
+    # check if there are no points left that are not a part of triangle
+    for p in diagram.neighbours_list[point]:
+        if points[p] and not any(triangles[t] and point not in diagram.simplices_list[t]
+                                 for t in diagram.triangles_by_points_list[p]):
+            return False
+
+    # check left triangles consistency
+    triangles_to_reach = {t for t in np.flatnonzero(triangles).tolist() if point not in diagram.simplices_list[t]}
+    reached = [triangles_to_reach.pop()] if len(triangles_to_reach) > 0 else []
+    while len(reached) > 0:
+        new_reached = triangles_to_reach.intersection(diagram.triangle_adjacency_list[reached.pop()])
+        reached.extend(new_reached)
+        triangles_to_reach -= new_reached
+
+    return len(triangles_to_reach) == 0
+
+
+class CheckedSet:
+    """
+    Points and candidates to add updated as they were before removability was tracked incrementally, with points to
+    remove checked over the whole set after every move
+    """
+
+    def __init__(self, diagram, points_set, minimal_regression):
+        self._diagram = diagram
+        self._minimal_regression = minimal_regression
+        self.points = points_set.points_mask.copy()
+        self.points_to_add = set(points_set.points_to_add)
+
+    def _eligible(self, p):
+        return self._diagram.regressions[p] > self._minimal_regression
+
+    def _third_points(self, a, b):
+        return [p for t in self._diagram.triangles_by_points_list[a] if b in self._diagram.simplices_list[t]
+                for p in self._diagram.simplices_list[t] if p != a and p != b]
+
+    def add_point(self, point):
+        self.points[point] = True
+        if self.points.sum() == 2:
+            self.points_to_add = set()
+        else:
+            self.points_to_add.remove(point)
+        for p in self._diagram.neighbours_list[point]:
+            if self.points[p]:
+                self.points_to_add.update(m for m in self._third_points(point, p)
+                                          if not self.points[m] and self._eligible(m))
+
+    def remove_point(self, point):
+        self.points[point] = False
+        if self.points.sum() == 1:
+            self.points_to_add = {p for p in self._diagram.neighbours_list[int(np.flatnonzero(self.points)[0])]
+                                  if self._eligible(p)}
+            return
+        for p in self._diagram.neighbours_list[point]:
+            if p in self.points_to_add and any(self.points[n] and any(self.points[m] for m in self._third_points(p, n))
+                                               for n in self._diagram.neighbours_list[p]):
+                self.points_to_add.remove(p)
+        self.points_to_add.add(point)
+
+    @property
+    def triangles(self):
+        return self.points[self._diagram.simplices].all(axis=1)
+
+    @property
+    def points_to_remove(self):
+        return {p for p in np.flatnonzero(self.points).tolist()
+                if can_remove(self._diagram, self.points, self.triangles, p)}
+
+
+def assert_same_as_checked(points_set, checked):
+    np.testing.assert_array_equal(points_set.points_mask, checked.points)
+    np.testing.assert_array_equal(points_set.triangles_mask, checked.triangles)
+    assert set(points_set.points_to_remove) == checked.points_to_remove
+    assert set(points_set.points_to_add) == checked.points_to_add
+
+
+def move_randomly(rng, points_set, moves, removing=0.4, checked=None):
+    """
+    Adds and removes random points, repeating the moves on checked and comparing them after every one if given
+    """
+    for _ in range(moves):
+        to_add = list(points_set.points_to_add)
+        to_remove = list(points_set.points_to_remove)
+        if len(to_remove) > 0 and (len(to_add) == 0 or rng.random() < removing):
+            move, point = 'remove_point', to_remove[rng.integers(len(to_remove))]
+        elif len(to_add) > 0:
+            move, point = 'add_point', to_add[rng.integers(len(to_add))]
+        else:
+            break
+        getattr(points_set, move)(point)
+        if checked is not None:
+            getattr(checked, move)(point)
+            assert_same_as_checked(points_set, checked)
+
+
+# about a sixth of the points is not eligible, so the set gets holes and splits into pieces
+MINIMAL_REGRESSION = -1.0
+
+
+def initial_set(rng, diagram):
+    eligible = np.flatnonzero(diagram.regressions > MINIMAL_REGRESSION)
+    return PointsSet(diagram, int(rng.choice(eligible)), 1.0, MINIMAL_REGRESSION)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_moves_match_checks_of_whole_set(seed):
+    rng = np.random.default_rng(seed)
+    diagram = random_diagram(rng, 200)
+    points_set = initial_set(rng, diagram)
+    move_randomly(rng, points_set, 400, checked=CheckedSet(diagram, points_set, MINIMAL_REGRESSION))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_set_made_at_once_matches_checks_of_whole_set(seed):
+    rng = np.random.default_rng(seed)
+    diagram = random_diagram(rng, 200)
+    points_set = initial_set(rng, diagram)
+    move_randomly(rng, points_set, 150, removing=0.2)
+
+    restored = PointsSet.from_state(diagram, points_set.state())
+    np.testing.assert_array_equal(restored.triangles_mask, points_set.triangles_mask)
+    assert restored.value == pytest.approx(points_set.value)
+    assert list(restored.points_to_add) == list(points_set.points_to_add)
+    assert list(restored.points_to_remove) == list(points_set.points_to_remove)
+
+    # a set made at once has to be connected
+    made = PointsSet.from_points(diagram, connected_region(diagram, points_set.points), 1.0, MINIMAL_REGRESSION)
+    assert set(made.points_to_remove) == CheckedSet(diagram, made, MINIMAL_REGRESSION).points_to_remove
+
+    move_randomly(rng, made, 100, removing=0.5, checked=CheckedSet(diagram, made, MINIMAL_REGRESSION))
+    move_randomly(rng, restored, 100, removing=0.5, checked=CheckedSet(diagram, restored, MINIMAL_REGRESSION))
+
+
+def test_points_of_split_triangles_are_refused():
+    rng = np.random.default_rng(0)
+    diagram = random_diagram(rng, 200)
+    # two triangles on opposite sides of the sphere
+    first = diagram.simplices[0]
+    second = diagram.simplices[np.argmin(diagram.coordinates[diagram.simplices[:, 0]] @ diagram.coordinates[first[0]])]
+
+    with pytest.raises(ValueError):
+        PointsSet.from_points(diagram, np.concatenate([first, second]), 1.0, MINIMAL_REGRESSION)
@@ -0,0 +1,42 @@
+import numpy as np
+
+from src.delaunay_diagram import DelaunayDiagram
+from src.points_set import PointsSet
+from src.simulated_annealing import SimulatedAnnealing, history_file_name
+import src.point as point
+
+
+def random_diagram(rng, n):
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    longitudes = rng.uniform(-180, 180, n)
+    return DelaunayDiagram(point.PointsTable(['p{}'.format(i) for i in range(n)], latitudes, longitudes,
+                                             rng.normal(size=n)))
+
+
+def test_resumed_run_continues_as_uninterrupted(tmp_path):
+    diagram = random_diagram(np.random.default_rng(0), 300)
+    parameters = dict(temperature=0.01, max_iterations=600, seed=3, log_interval=0)
+    checkpoint_file = str(tmp_path / 'run.npz')
+
+    uninterrupted = SimulatedAnnealing(PointsSet(diagram, 0, 1.0, -1.0), **parameters)
+    uninterrupted.calculate()
+
+    stopped = SimulatedAnnealing(PointsSet(diagram, 0, 1.0, -1.0), checkpoint_file=checkpoint_file,
+                                 checkpoint_interval=100, **parameters)
+    stopped.calculate(iterations=250)
+    # records appended by a run that crashed before replacing the checkpoint are dropped on resume
+    with open(history_file_name(checkpoint_file), 'ab') as file:
+        file.write(b'\0' * 64)
+
+    resumed = SimulatedAnnealing.from_checkpoint(checkpoint_file, diagram, max_iterations=600, log_interval=0,
+                                                 checkpoint_file=checkpoint_file, checkpoint_interval=100)
+    assert resumed.iterations == 250
+    resumed.calculate()
+
+    assert resumed.max_value == uninterrupted.max_value
+    np.testing.assert_array_equal(resumed.best_points, uninterrupted.best_points)
+    np.testing.assert_array_equal(resumed.points_set.points, uninterrupted.points_set.points)
+    assert resumed.history.equals(uninterrupted.history)
+
+    reloaded = SimulatedAnnealing.from_checkpoint(checkpoint_file, diagram, max_iterations=600, log_interval=0)
+    assert reloaded.history.equals(uninterrupted.history)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from src.components import triangle_components
+from src.delaunay_diagram import DelaunayDiagram
+from src.threshold_sweep import ThresholdSweep
+import src.point as point
+
+
+def random_diagram(rng, n):
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    longitudes = rng.uniform(-180, 180, n)
+    return DelaunayDiagram(point.PointsTable(['p{}'.format(i) for i in range(n)], latitudes, longitudes,
+                                             rng.normal(size=n)))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_area_of_region_is_area_of_its_points_set(seed):
+    diagram = random_diagram(np.random.default_rng(seed), 2000)
+    threshold_sweep = ThresholdSweep(diagram)
+
+    for minimal_regression in np.linspace(-1.5, 0.5, 30):
+        points_set = threshold_sweep.points_set(minimal_regression, 1.0)
+        if points_set is None:
+            assert threshold_sweep.largest_area(minimal_regression) == 0
+            continue
+        triangles, points = threshold_sweep.region(minimal_regression)
+
+        assert triangle_components(diagram, points_set.triangles_mask)[1] == 1
+        np.testing.assert_array_equal(np.flatnonzero(points_set.triangles_mask), triangles)
+        np.testing.assert_array_equal(points_set.points, points)
+        assert threshold_sweep.largest_area(minimal_regression) == pytest.approx(points_set.area)